@@ -1,9 +1,11 @@
+from bisect import bisect_right
 from collections import defaultdict
 from copy import deepcopy
 from enum import Enum
 from typing import Union, List, Tuple, Optional, Dict
 
 from mnms.time import Time, Dt
+from mnms.tools.geometry import LinkPosition
 from mnms.tools.observer import TimeDependentSubject
 
 import numpy as np
@@ -64,8 +66,17 @@ class User(TimeDependentSubject):
         self._waiting_vehicle = False
         self._current_node = None
         self._distance = 0
+        self._path_cursor: Optional[Tuple[List[str], str, int]] = None
+        # Arrays holding the position and distance of the User while it walks
+        self._walking_state = None
+        # Vehicle carrying the User and its distance at boarding, the distance travelled since boarding is added
+        # to the distance of the User when it is read or when the User alights
+        self._riding_vehicle = None
+        self._boarding_distance: float = 0
 
         self._state = UserState.STOP
+        # Users of the UserFlow by state, kept up to date by the state transitions
+        self._state_buckets: Optional[Dict[UserState, Dict[str, "User"]]] = None
 
         self.response_dt = User.default_response_dt.copy() if response_dt is None else response_dt
         self.pickup_dt = defaultdict(lambda: User.default_pickup_dt.copy() if response_dt is None else lambda: pickup_dt)
@@ -87,11 +98,18 @@ class User(TimeDependentSubject):
 
     @property
     def distance(self):
+        if self._walking_state is not None:
+            return self._walking_state.user_distance(self)
+        if self._riding_vehicle is not None:
+            return self._distance + (self._riding_vehicle._distance - self._boarding_distance)
         return self._distance
 
     @property
     def position(self):
-        return self._position
+        if self._walking_state is not None:
+            return self._walking_state.user_position(self)
+        position = self._position
+        return position.position if isinstance(position, LinkPosition) else position
 
     @property
     def vehicle(self):
@@ -109,12 +127,28 @@ class User(TimeDependentSubject):
         self.arrival_time = arrival_time
         # self.notify()
 
+    @property
+    def path_cursor(self) -> Tuple[int, Optional[int]]:
+        """
+        Position of the User along its path, it is only computed again when the current node or the path change
+
+        Returns:
+            The index of the current node in the path nodes and the index of the layer segment of the path
+            containing it, None if the node is not in any segment
+        """
+        path = self.path
+        cursor = self._path_cursor
+        if cursor is None or cursor[0] is not path.nodes or cursor[1] != self._current_node:
+            cursor = (path.nodes, self._current_node, path.node_index(self._current_node))
+            self._path_cursor = cursor
+        return cursor[2], path.layer_index(cursor[2])
+
     def set_path(self, path: "Path"):
         self.path: Path = path
         self._current_node = path.nodes[0]
         self._current_link = (path.nodes[0], path.nodes[1])
 
-    def set_position(self, current_link:Tuple[str, str], remaining_length:float, position:np.ndarray):
+    def set_position(self, current_link:Tuple[str, str], remaining_length:float, position:Union[np.ndarray, LinkPosition]):
         self._current_link = current_link
         self._remaining_link_length = remaining_length
         self._position = position
@@ -122,23 +156,41 @@ class User(TimeDependentSubject):
     def update_distance(self, dist: float):
         self._distance += dist
 
+    def start_riding(self, vehicle: "Vehicle"):
+        if self._riding_vehicle is not vehicle:
+            self.stop_riding()
+            self._riding_vehicle = vehicle
+            self._boarding_distance = vehicle._distance
+
+    def stop_riding(self):
+        if self._riding_vehicle is not None:
+            self._distance += self._riding_vehicle._distance - self._boarding_distance
+            self._riding_vehicle = None
+
+    def _set_state(self, state: UserState):
+        buckets = self._state_buckets
+        if buckets is not None:
+            del buckets[self._state][self.id]
+            buckets[state][self.id] = self
+        self._state = state
+
     def set_state_arrived(self):
-        self._state = UserState.ARRIVED
+        self._set_state(UserState.ARRIVED)
 
     def set_state_walking(self):
-        self._state = UserState.WALKING
+        self._set_state(UserState.WALKING)
 
     def set_state_inside_vehicle(self):
-        self._state = UserState.INSIDE_VEHICLE
+        self._set_state(UserState.INSIDE_VEHICLE)
 
     def set_state_waiting_vehicle(self):
-        self._state = UserState.WAITING_VEHICLE
+        self._set_state(UserState.WAITING_VEHICLE)
 
     def set_state_waiting_answer(self):
-        self._state = UserState.WAITING_ANSWER
+        self._set_state(UserState.WAITING_ANSWER)
 
     def set_state_stop(self):
-        self._state = UserState.STOP
+        self._set_state(UserState.STOP)
 
 
 class Path(object):
@@ -154,10 +206,58 @@ class Path(object):
         self.ind = ind
         self.path_cost: float = cost
         self.layers: List[Tuple[str, slice]] = list()
+        self._layer_starts: Optional[Tuple[List[Tuple[str, slice]], List[int]]] = None
         self.mobility_services = list()
         self.nodes: Tuple[str] = nodes
         self.service_costs = dict()
 
+    @property
+    def nodes(self) -> Tuple[str]:
+        return self._nodes
+
+    @nodes.setter
+    def nodes(self, nodes: Union[List[str], Tuple[str]]):
+        self._nodes = nodes
+        self._node_indices: Optional[Dict[str, int]] = None
+
+    def node_index(self, node: str) -> int:
+        """
+        Index of the first occurrence of a node in the path, as `nodes.index` but with a mapping built once
+        per path
+
+        Args:
+            node: The node
+
+        Returns:
+            The index of the node
+        """
+        if self._node_indices is None:
+            self._node_indices = dict()
+            for ind, n in enumerate(self._nodes):
+                self._node_indices.setdefault(n, ind)
+        try:
+            return self._node_indices[node]
+        except KeyError:
+            raise ValueError(f"{node} is not in the path")
+
+    def layer_index(self, node_index: int) -> Optional[int]:
+        """
+        Index of the layer segment of the path containing a node
+
+        Args:
+            node_index: The index of the node in the path
+
+        Returns:
+            The index of the segment, None if the node is not in any segment
+        """
+        if self._layer_starts is None or self._layer_starts[0] is not self.layers \
+                or len(self._layer_starts[1]) != len(self.layers):
+            self._layer_starts = (self.layers, [slice_nodes.start for _, slice_nodes in self.layers])
+        ilayer = bisect_right(self._layer_starts[1], node_index) - 1
+        if ilayer >= 0 and node_index < self.layers[ilayer][1].stop:
+            return ilayer
+        return None
+
     def construct_layers(self, gnodes):
         layer = gnodes[self.nodes[1]].label
         start = 1
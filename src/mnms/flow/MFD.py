@@ -1,7 +1,7 @@
 import sys
 from collections import defaultdict
 from dataclasses import dataclass
-from typing import List, Optional, Tuple, Union
+from typing import List, Optional, Set, Tuple, Union
 from typing import Callable, Dict
 
 import numpy as np
@@ -10,9 +10,11 @@ from hipop.graph import Link
 
 from mnms.demand import User
 from mnms.flow.abstract import AbstractMFDFlowMotor, AbstractReservoir
+from mnms.flow.vehicle_state import VehicleStateArrays
 from mnms.graph.zone import Zone
 from mnms.log import create_logger
-from mnms.time import Dt, Time
+from mnms.time import Dt, Time, seconds_to_ticks
+from mnms.tools.geometry import LinkPosition
 from mnms.vehicles.manager import VehicleManager
 from mnms.vehicles.veh_type import Vehicle, VehicleState
 from mnms.graph.layers import PublicTransportLayer
@@ -29,6 +31,25 @@ class LinkInfo:
     sections: List[Tuple[str, float]]
 
 
+@dataclass
+class LinkSectionMatrix:
+    """
+    Sparse (links x reservoirs) matrix in coordinate format of the lengths of the link sections,
+    for all the links of one vehicle type
+    """
+    links: List[LinkInfo]
+    row: np.ndarray
+    col: np.ndarray
+    length: np.ndarray
+    total_length: np.ndarray
+    layer_rows: Dict[str, np.ndarray]
+
+    def dot(self, reservoir_speeds: np.ndarray) -> np.ndarray:
+        return np.bincount(self.row,
+                           weights=self.length * reservoir_speeds[self.col],
+                           minlength=len(self.links))
+
+
 class Reservoir(AbstractReservoir):
     def __init__(self,
                  zone: Zone,
@@ -57,7 +78,20 @@ class Reservoir(AbstractReservoir):
 
 
 class MFDFlowMotor(AbstractMFDFlowMotor):
-    def __init__(self, outfile: str = None):
+    def __init__(self, outfile: str = None, vectorized_vehicles: bool = False, speed_tolerance: Optional[float] = None,
+                 eager_positions: bool = False):
+        """
+        Flow motor moving the vehicles at the speed given by the MFD of the reservoirs they are in
+
+        Args:
+            outfile: If not None, write the speed and accumulation of each reservoir in that file
+            vectorized_vehicles: If True, the vehicles staying on their link during a step are moved
+                together with NumPy, only the vehicles reaching the end of their link go through `move_veh`
+            speed_tolerance: If not None, `update_graph` only updates the costs of the links crossing a reservoir
+                whose speed changed by more than this relative tolerance since its last update
+            eager_positions: If True, the position of the vehicles and their passengers is computed at each move,
+                otherwise it is only computed when it is read
+        """
         super(MFDFlowMotor, self).__init__(outfile=outfile)
         if outfile is not None:
             self._csvhandler.writerow(['AFFECTATION_STEP', 'FLOW_STEP', 'TIME', 'RESERVOIR', 'MODE', 'SPEED', 'ACCUMULATION'])
@@ -74,6 +108,19 @@ class MFDFlowMotor(AbstractMFDFlowMotor):
 
         self._layer_link_length_mapping: Dict[str, LinkInfo] = dict()
         self._section_to_reservoir: Dict[str, Union[str, None]] = dict()
+        self._link_to_reservoir: Dict[Tuple[str, str], Union[str, None]] = dict()
+        self._reservoir_columns: List[Union[str, None]] = list()
+        self._reservoir_column_index: Dict[Union[str, None], int] = dict()
+        self._link_section_matrices: Dict[str, LinkSectionMatrix] = dict()
+
+        self._vectorized_vehicles: bool = vectorized_vehicles
+        self._vehicle_state: Optional[VehicleStateArrays] = None
+
+        self._speed_tolerance: Optional[float] = speed_tolerance
+        self._eager_positions: bool = eager_positions
+        self._last_reservoir_speeds: Dict[str, np.ndarray] = dict()
+        self.nb_updated_links: int = 0
+        self.nb_skipped_links: int = 0
 
     def _reset_mapping(self):
         graph = self._graph.graph
@@ -104,15 +151,61 @@ class MFDFlowMotor(AbstractMFDFlowMotor):
 
                 self._layer_link_length_mapping[lid] = LinkInfo(link, link_layer.vehicle_type.upper(), sections_length)
 
-        res_links = {res.id: roads.zones[res.id] for res in self.reservoirs.values()}
-        res_dict = {res.id: res for res in self.reservoirs.values()}
-        for section in roads.sections.keys():
-            self._section_to_reservoir[section] = None
-            for resid, zone in res_links.items():
-                res = res_dict[resid]
-                if section in res.zone.sections:
+        self._reset_link_to_reservoir()
+
+        self._section_to_reservoir = {section: None for section in roads.sections.keys()}
+        for res in self.reservoirs.values():
+            for section in res.zone.sections:
+                if section in self._section_to_reservoir and self._section_to_reservoir[section] is None:
                     self._section_to_reservoir[section] = res.id
-                    break
+
+        self._reset_link_section_matrices()
+
+        if self._vehicle_state is not None:
+            self._vehicle_state.reset_link_zones()
+
+    def _reset_link_section_matrices(self):
+        # Last column gathers the sections outside of any reservoir
+        self._reservoir_columns = list(self.reservoirs.keys()) + [None]
+        self._reservoir_column_index = {res_id: i for i, res_id in enumerate(self._reservoir_columns)}
+        res_columns = self._reservoir_column_index
+
+        links_by_veh = defaultdict(list)
+        for link_info in self._layer_link_length_mapping.values():
+            links_by_veh[link_info.veh].append(link_info)
+
+        self._link_section_matrices = dict()
+        self._last_reservoir_speeds = dict()
+        for veh, links in links_by_veh.items():
+            row = list()
+            col = list()
+            length = list()
+            for i, link_info in enumerate(links):
+                for section, section_length in link_info.sections:
+                    row.append(i)
+                    col.append(res_columns[self._section_to_reservoir[section]])
+                    length.append(section_length)
+            row = np.array(row, dtype=np.int64)
+            length = np.array(length, dtype=float)
+            layer_rows = defaultdict(list)
+            for i, link_info in enumerate(links):
+                layer_rows[link_info.link.label].append(i)
+            self._link_section_matrices[veh] = LinkSectionMatrix(links,
+                                                                 row,
+                                                                 np.array(col, dtype=np.int64),
+                                                                 length,
+                                                                 np.bincount(row, weights=length, minlength=len(links)),
+                                                                 {label: np.array(rows, dtype=np.int64) for label, rows in layer_rows.items()})
+
+    def _reset_link_to_reservoir(self):
+        roads = self._graph.roads
+        map_reference_links = self._graph.map_reference_links
+        self._link_to_reservoir = dict()
+        for lid, link in self._graph.graph.links.items():
+            reference_sections = map_reference_links.get(lid)
+            if reference_sections and reference_sections[0] in roads.sections:
+                # take reservoir of first part of trip
+                self._link_to_reservoir[(link.upstream, link.downstream)] = roads.sections[reference_sections[0]].zone
 
     def initialize(self, walk_speed):
         # initialize costs on links
@@ -121,6 +214,8 @@ class MFDFlowMotor(AbstractMFDFlowMotor):
         for lid, layer in self._graph.layers.items():
             link_layers.append(layer.graph.links) # only non transit links concerned
 
+        links_costs = list()
+        batch_links = defaultdict(list)
         for link in self._graph.graph.links.values():
             costs = {}
             if link.label == "TRANSIT":
@@ -145,6 +240,24 @@ class MFDFlowMotor(AbstractMFDFlowMotor):
                     for cost_name, cost_func in cost_functions.items():
                         costs[mservice][cost_name] = cost_func(self._graph, link, costs)
 
+            links_costs.append((link, costs))
+            if layer._batch_costs_functions:
+                batch_links[link.label].append((link, costs, speed))
+
+        # Batch cost functions are computed once per layer
+        for label, links in batch_links.items():
+            layer = self._graph.transitlayer if label == "TRANSIT" else self._graph.layers[label]
+            lengths = np.array([link.length for link, _, _ in links], dtype=float)
+            speeds = np.array([speed for _, _, speed in links], dtype=float)
+            batch_costs = layer.compute_batch_costs(self._graph,
+                                                    [link.id for link, _, _ in links],
+                                                    {'length': lengths, 'speed': speeds, 'travel_time': lengths / speeds})
+            for mservice, service_costs in batch_costs.items():
+                for cost_name, values in service_costs.items():
+                    for (_, costs, _), value in zip(links, values.tolist()):
+                        costs[mservice][cost_name] = value
+
+        for link, costs in links_costs:
             link.update_costs(costs)
 
             for links in link_layers: # only non transit links concerned
@@ -165,27 +278,20 @@ class MFDFlowMotor(AbstractMFDFlowMotor):
         self.veh_manager = VehicleManager()
         self.graph_nodes = self._graph.graph.nodes
 
+        if self._vectorized_vehicles:
+            self._vehicle_state = VehicleStateArrays(self.graph_nodes, self._get_link_zone_column)
+
         self._reset_mapping()
 
     def add_reservoir(self, res: Reservoir):
         self.reservoirs[res.id] = res
+        if self.graph_nodes is not None:
+            # The motor is already initialized, the link mappings must take into account the new reservoir
+            self._reset_mapping()
 
     def set_vehicle_position(self, veh: Vehicle):
-        unode, dnode = veh.current_link
-        remaining_length = veh.remaining_link_length
-
-        unode_pos = np.array(self.graph_nodes[unode].position)
-        dnode_pos = np.array(self.graph_nodes[dnode].position)
-
-        direction = dnode_pos - unode_pos
-        norm_direction = np.linalg.norm(direction)
-        if norm_direction > 0:
-            normalized_direction = direction / norm_direction
-            travelled = norm_direction - remaining_length
-        else:
-            normalized_direction = direction
-            travelled = 0
-        veh.set_position(unode_pos+normalized_direction*travelled)
+        position = LinkPosition(self.graph_nodes, veh.current_link, veh.remaining_link_length)
+        veh.set_position(position.position if self._eager_positions else position)
 
     def move_veh(self, veh: Vehicle, tcurrent: Time, dt: float, speed: float) -> float:
         dist_travelled = dt*speed
@@ -196,8 +302,7 @@ class MFDFlowMotor(AbstractMFDFlowMotor):
             veh.update_distance(dist_travelled)
             veh._remaining_link_length = 0
             self.set_vehicle_position(veh)
-            for passenger_id, passenger in veh.passenger.items():
-                passenger.set_position(veh._current_link, veh.remaining_link_length, veh.position)
+            veh.set_passengers_position()
 
             try:
                 current_link, remaining_link_length = next(veh.activity.iter_path)
@@ -214,26 +319,40 @@ class MFDFlowMotor(AbstractMFDFlowMotor):
             veh._remaining_link_length -= dist_travelled
             veh.update_distance(dist_travelled)
             self.set_vehicle_position(veh)
-            for passenger_id, passenger in veh.passenger.items():
-                passenger.set_position(veh._current_link, veh.remaining_link_length, veh.position)
+            veh.set_passengers_position()
             return dt
 
     def get_vehicle_zone(self, veh):
+        try:
+            return self._link_to_reservoir[veh.current_link]
+        except (KeyError, TypeError):
+            pass
+
+        # The link is not in the lookup table, it has been created after the initialization
+        # or it has no reference section
         try:
             unode, dnode = veh.current_link
             curr_link = self.graph_nodes[unode].adj[dnode]
             lid = self._graph.map_reference_links[curr_link.id][0]  # take reservoir of first part of trip
             res_id = self._graph.roads.sections[lid].zone
+            self._link_to_reservoir[(unode, dnode)] = res_id
         except:
-            pos = veh.position
-            res_id = None
-            for res in self.reservoirs.values():
-                if res.zone.is_inside([pos]):
-                    res_id = res.id
-                    break
+            res_id = self.get_position_zone(veh.position)
 
         return res_id
 
+    def _get_link_zone_column(self, link: Tuple[str, str]) -> int:
+        # Links outside of the lookup table get their zone from the position of the vehicles, see get_vehicle_zone
+        if link not in self._link_to_reservoir:
+            return -1
+        return self._reservoir_column_index.get(self._link_to_reservoir[link], -1)
+
+    def get_position_zone(self, pos):
+        for res in self.reservoirs.values():
+            if res.zone.is_inside([pos]):
+                return res.id
+        return None
+
     def step(self, dt: Dt):
 
         log.info(f'MFD step {self._tcurrent}')
@@ -257,6 +376,9 @@ class MFDFlowMotor(AbstractMFDFlowMotor):
             if veh.state is not VehicleState.STOP:
                 self.count_moving_vehicle(veh, current_vehicles)
 
+        if self._vehicle_state is not None:
+            self.count_vehicles_in_batch(list(current_vehicles.values()))
+
         log.info(f"Moving {len(current_vehicles)} vehicles")
 
         # Update the traffic conditions
@@ -264,97 +386,242 @@ class MFDFlowMotor(AbstractMFDFlowMotor):
             self.update_reservoir_speed(res, self.dict_accumulations[res.id])
 
         # Move the vehicles
+        if self._vehicle_state is not None:
+            moved_vehicles = self.move_vehicles_on_link(dt.to_seconds())
+        else:
+            moved_vehicles = set()
+
+        new_time = self._tcurrent.add_time(dt)
         for veh_id, veh in current_vehicles.items():
-            veh_dt = dt.to_seconds()
-            veh_type = veh.type.upper()
-            while veh_dt > 0:
-                res_id = self.get_vehicle_zone(veh)
-                speed = self.dict_speeds[res_id][veh_type]
-                veh.speed = speed
-                elapsed_time = self.move_veh(veh, self._tcurrent, veh_dt, speed)
-                veh_dt -= elapsed_time
-            new_time = self._tcurrent.add_time(dt)
+            if veh_id not in moved_vehicles:
+                veh_dt = dt.to_seconds()
+                veh_type = veh.type.upper()
+                while veh_dt > 0:
+                    res_id = self.get_vehicle_zone(veh)
+                    speed = self.dict_speeds[res_id][veh_type]
+                    veh.speed = speed
+                    elapsed_time = self.move_veh(veh, self._tcurrent, veh_dt, speed)
+                    veh_dt -= elapsed_time
             veh.notify(new_time)
             veh.notify_passengers(new_time)
 
+    def count_vehicles_in_batch(self, vehicles: List[Vehicle]):
+        """
+        Load the moving vehicles in the vehicle state and add them to the accumulations of their zone, the
+        vehicles whose zone depends on their position are located one by one
+
+        Args:
+            vehicles: The moving vehicles
+        """
+        state = self._vehicle_state
+        state.load(vehicles)
+        for i in np.flatnonzero(state.zone < 0).tolist():
+            state.zone[i] = self._reservoir_column_index[self.get_vehicle_zone(vehicles[i])]
+
+        counts = state.count(len(self._reservoir_columns))
+        for col, type_ind in zip(*np.nonzero(counts)):
+            res_id = self._reservoir_columns[col]
+            self.dict_accumulations[res_id][state.vehicle_types[type_ind]] += int(counts[col, type_ind])
+
+    def move_vehicles_on_link(self, dt: float) -> Set[str]:
+        """
+        Move in one vectorized update the vehicles of the vehicle state that do not reach the end of their
+        current link during dt
+
+        Args:
+            dt: The duration of the move in seconds
+
+        Returns:
+            The ids of the vehicles that have been moved
+        """
+        state = self._vehicle_state
+        speeds = np.full((len(self._reservoir_columns), len(state.vehicle_types)), np.nan)
+        for col, res_id in enumerate(self._reservoir_columns):
+            res_speeds = self.dict_speeds[res_id]
+            for type_ind, veh_type in enumerate(state.vehicle_types):
+                if veh_type in res_speeds:
+                    speeds[col, type_ind] = res_speeds[veh_type]
+        state.set_speeds(speeds)
+        on_link = state.advance(dt)
+
+        moved_vehicles = set()
+        vehicles = state.vehicles
+        speed = state.speed.tolist()
+        remaining_length = state.remaining_length.tolist()
+        distance = state.distance.tolist()
+        position = state.position
+        for i in np.flatnonzero(on_link).tolist():
+            veh = vehicles[i]
+            veh.speed = speed[i]
+            veh._remaining_link_length = remaining_length[i]
+            veh.update_distance(distance[i])
+            veh.set_position(position[i])
+            if veh.passenger:
+                veh.set_passengers_position()
+            moved_vehicles.add(veh.id)
+
+        log.debug(f"Moved {len(moved_vehicles)} vehicles on their link, {len(vehicles)-len(moved_vehicles)} left")
+
+        return moved_vehicles
+
     def update_reservoir_speed(self, res, dict_accumulations):
         res.update_accumulations(dict_accumulations)
         self.dict_speeds[res.id] = res.update_speeds()
 
     def count_moving_vehicle(self, veh: Vehicle, current_vehicles):
         # log.info(f"{veh} -> {veh.current_link}")
-        res_id = self.get_vehicle_zone(veh)
-        veh_type = veh.type.upper()
-        self.dict_accumulations[res_id][veh_type] += 1
+        if self._vehicle_state is None:
+            res_id = self.get_vehicle_zone(veh)
+            veh_type = veh.type.upper()
+            self.dict_accumulations[res_id][veh_type] += 1
+        # Otherwise the moving vehicles are counted all at once by count_vehicles_in_batch
         current_vehicles[veh.id] = veh
 
     def finish_vehicle_activities(self, veh: Vehicle):
-        elapsed_time = Dt(seconds=veh.remaining_link_length / veh.speed)
+        new_time = Time.from_ticks(self._tcurrent.ticks + seconds_to_ticks(veh.remaining_link_length / veh.speed))
         log.info(f"{veh} finished its activity {veh.state}")
         veh.update_distance(veh.remaining_link_length)
         veh._remaining_link_length = 0
         veh._current_node = veh._current_link[1]
         self.set_vehicle_position(veh)
         veh.next_activity()
-        new_time = self._tcurrent.add_time(elapsed_time)
         veh.notify(new_time)
         veh.notify_passengers(new_time)
 
+    def _get_reservoir_speeds(self, veh: str) -> np.ndarray:
+        speeds = np.empty(len(self._reservoir_columns))
+        for i, res_id in enumerate(self._reservoir_columns):
+            speed = self.reservoirs[res_id].dict_speeds[veh] if res_id is not None else None
+            speeds[i] = speed if speed is not None else np.nan
+        return speeds
+
+    def _get_link_speed(self, link_info: LinkInfo) -> float:
+        # Per link computation, used when a section of the link has no speed
+        costs = link_info.link.costs
+        current_speed = next((c["speed"] for c in costs.values() if "speed" in c), 0)
+        total_len = 0
+        new_speed = 0
+        for section, length in link_info.sections:
+            res_id = self._section_to_reservoir[section]
+            speed = self.reservoirs[res_id].dict_speeds[link_info.veh] if res_id is not None else None
+            total_len += length
+            if speed is not None:
+                new_speed += length * speed
+            else:
+                new_speed += length * current_speed
+        return new_speed / total_len if total_len != 0 else new_speed
+
+    def _get_links_to_update(self, matrix: LinkSectionMatrix, veh: str, reservoir_speeds: np.ndarray) -> np.ndarray:
+        last_speeds = self._last_reservoir_speeds.get(veh)
+        if self._speed_tolerance is None or last_speeds is None:
+            self._last_reservoir_speeds[veh] = reservoir_speeds.copy()
+            return np.ones(len(matrix.links), dtype=bool)
+
+        # A reservoir has changed if its speed moved by more than the tolerance since its last update,
+        # reservoirs without speed (NaN) are considered unchanged
+        with np.errstate(invalid='ignore'):
+            changed = np.abs(reservoir_speeds - last_speeds) > self._speed_tolerance * np.abs(last_speeds)
+        changed |= np.isnan(reservoir_speeds) != np.isnan(last_speeds)
+        last_speeds[changed] = reservoir_speeds[changed]
+
+        return np.bincount(matrix.row, weights=changed[matrix.col], minlength=len(matrix.links)) > 0
+
+    def compute_link_speeds(self, matrix: LinkSectionMatrix, veh: str, reservoir_speeds: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Compute the speed of the links of a vehicle type as the mean of the speed of their sections
+        weighted by the section lengths
+
+        Args:
+            matrix: The section matrix of the links
+            veh: The vehicle type of the links
+            reservoir_speeds: The speed of each reservoir column, computed from the reservoirs if None
+
+        Returns:
+            The new speed of each link of the matrix
+        """
+        if reservoir_speeds is None:
+            reservoir_speeds = self._get_reservoir_speeds(veh)
+        weighted_speeds = matrix.dot(reservoir_speeds)
+        total_length = matrix.total_length
+        with np.errstate(divide='ignore', invalid='ignore'):
+            new_speeds = np.where(total_length != 0, weighted_speeds / total_length, weighted_speeds)
+
+        for i in np.flatnonzero(np.isnan(new_speeds)):
+            new_speeds[i] = self._get_link_speed(matrix.links[i])
+
+        return new_speeds
+
     def update_graph(self):
         graph = self._graph.graph
         banned_links = self._graph.dynamic_space_sharing.banned_links
         banned_cost = self._graph.dynamic_space_sharing.cost
 
-        link_layers = list()
-        for lid, layer in self._graph.layers.items():
-            link_layers.append(layer.graph.links)
-
-        for lid, link_info in self._layer_link_length_mapping.items():
-            total_len = 0
-            new_speed = 0
-            for section, length in link_info.sections:
-                res_id = self._section_to_reservoir[section]
-                res = self.reservoirs[res_id]
-                speed = res.dict_speeds[link_info.veh]
-                total_len += length
-                if speed is not None:
-                    new_speed += length * speed
-                else:
-                    new_speed += length * graph.links[lid].cost["speed"]
-            new_speed = new_speed / total_len if total_len != 0 else new_speed
-            if new_speed != 0:  # TODO: check if this condition is still useful
-                # costs = {'travel_time': total_len / new_speed,
-                #          'speed': new_speed,
-                #          'length': total_len}
-                costs = defaultdict(dict)
-
-                link = link_info.link
-
-                # Update critical costs first
-                for mservice in link.costs.keys():
-                    costs[mservice] = {'travel_time': total_len / new_speed,
-                                       'speed': new_speed,
-                                       'length': total_len}
-
-                # The update the generalized one
-                layer = self._graph.layers[graph.links[lid].label]
-                costs_functions = layer._costs_functions
-                for mservice, cost_funcs in costs_functions.items():
-                    for cost_name, cost_f in cost_funcs.items():
-                        costs[mservice][cost_name] = cost_f(self._graph, graph.links[lid], costs)
-
-                # Test if link is banned, if yes do not update the cost for the banned mobility service
-                if lid in banned_links:
-                    mservice = banned_links[lid].mobility_service
-                    costs[mservice].pop(banned_cost, None)
-
-                graph.update_link_costs(lid, costs)
-
-                # Update of the cost in the corresponding graph layer
-                for links in link_layers:
-                    if lid in links:
-                        links[lid].update_costs(costs)
-                        break
+        graph_costs = dict()
+        layers_costs = defaultdict(dict)
+        for veh, matrix in self._link_section_matrices.items():
+            reservoir_speeds = self._get_reservoir_speeds(veh)
+            to_update = self._get_links_to_update(matrix, veh, reservoir_speeds)
+            nb_to_update = int(np.count_nonzero(to_update))
+            self.nb_updated_links += nb_to_update
+            self.nb_skipped_links += len(matrix.links) - nb_to_update
+            if nb_to_update == 0:
+                continue
+
+            new_speeds = self.compute_link_speeds(matrix, veh, reservoir_speeds)
+            to_update &= new_speeds != 0  # TODO: check if this condition is still useful
+            total_lengths = matrix.total_length.tolist()
+            for link_info, update, new_speed, total_len in zip(matrix.links, to_update.tolist(), new_speeds.tolist(), total_lengths):
+                if update:
+                    costs = defaultdict(dict)
+
+                    link = link_info.link
+                    lid = link.id
+
+                    # Update critical costs first
+                    for mservice in link.costs.keys():
+                        costs[mservice] = {'travel_time': total_len / new_speed,
+                                           'speed': new_speed,
+                                           'length': total_len}
+
+                    # The update the generalized one
+                    layer = self._graph.layers[link.label]
+                    costs_functions = layer._costs_functions
+                    for mservice, cost_funcs in costs_functions.items():
+                        for cost_name, cost_f in cost_funcs.items():
+                            costs[mservice][cost_name] = cost_f(self._graph, link, costs)
+
+                    graph_costs[lid] = costs
+                    layers_costs[link.label][lid] = costs
+
+            # Then the batch ones, once per layer
+            for label, rows in matrix.layer_rows.items():
+                layer = self._graph.layers[label]
+                rows = rows[to_update[rows]]
+                if not layer._batch_costs_functions or len(rows) == 0:
+                    continue
+                lids = [matrix.links[i].link.id for i in rows.tolist()]
+                speeds = new_speeds[rows]
+                lengths = matrix.total_length[rows]
+                batch_costs = layer.compute_batch_costs(self._graph,
+                                                        lids,
+                                                        {'length': lengths, 'speed': speeds, 'travel_time': lengths / speeds})
+                for mservice, service_costs in batch_costs.items():
+                    for cost_name, values in service_costs.items():
+                        for lid, value in zip(lids, values.tolist()):
+                            graph_costs[lid][mservice][cost_name] = value
+
+        # Test if link is banned, if yes do not update the cost for the banned mobility service
+        for lid, banned_link in banned_links.items():
+            if lid in graph_costs:
+                graph_costs[lid][banned_link.mobility_service].pop(banned_cost, None)
+
+        graph.update_costs(graph_costs)
+        # Without tolerance all the links are considered as updated
+        self.updated_links = set(graph_costs) if self._speed_tolerance is not None else None
+
+        # Update of the cost in the corresponding graph layer
+        for layer_id, costs in layers_costs.items():
+            self._graph.layers[layer_id].graph.update_costs(costs)
 
     def write_result(self, step_affectation: int, step_flow:int):
         tcurrent = self._tcurrent.time
@@ -1,6 +1,6 @@
 from abc import ABC, abstractmethod
 from collections import defaultdict
-from typing import List, Dict, Optional, Callable
+from typing import List, Dict, Optional, Callable, Set
 import csv
 
 from mnms.graph.zone import Zone
@@ -69,6 +69,9 @@ class AbstractMFDFlowMotor(ABC):
         self._demand = dict()
         self._tcurrent: Time = Time()
 
+        # Ids of the links whose costs changed during the last `update_graph`, None if unknown
+        self.updated_links: Optional[Set[str]] = None
+
         if outfile is None:
             self._write = False
         else:
@@ -65,14 +65,19 @@ class CongestedReservoir(AbstractReservoir):
 
 
 class CongestedMFDFlowMotor(MFDFlowMotor):
-    def __init__(self, outfile: Optional[str] = None):
+    def __init__(self, outfile: Optional[str] = None, vectorized_vehicles: bool = False, speed_tolerance: Optional[float] = None,
+                 eager_positions: bool = False):
         """
         Congested flow motor with waiting queue between the reservoirs
 
         Args:
             outfile: If not None, write ouptut in that file
+            vectorized_vehicles: If True, the vehicles staying on their link during a step are moved with NumPy
+            speed_tolerance: If not None, only the costs of the links crossing a reservoir whose speed changed by
+                more than this relative tolerance are updated
+            eager_positions: If True, the position of the vehicles is computed at each move instead of when it is read
         """
-        super(CongestedMFDFlowMotor, self).__init__(outfile)
+        super(CongestedMFDFlowMotor, self).__init__(outfile, vectorized_vehicles, speed_tolerance, eager_positions)
 
         self.reservoirs: Dict[str, CongestedReservoir] = dict()
         self.car_in_queues = set()
@@ -134,8 +139,7 @@ class CongestedMFDFlowMotor(MFDFlowMotor):
                     veh.update_distance(veh_remaining_length-link_length)
                     veh.speed = 0
                     self.set_vehicle_position(veh)
-                    for passenger_id, passenger in veh.passenger.items():
-                        passenger.set_position(veh._current_link, veh.remaining_link_length, veh.position)
+                    veh.set_passengers_position()
                     return dt
         else:
             elapsed_time = super(CongestedMFDFlowMotor, self).move_veh(veh, tcurrent, dt, speed)
@@ -147,4 +151,4 @@ class CongestedMFDFlowMotor(MFDFlowMotor):
             super(CongestedMFDFlowMotor, self).count_moving_vehicle(veh, current_vehicles)
 
     def add_reservoir(self, res: CongestedReservoir):
-        self.reservoirs[res.id] = res
\ No newline at end of file
+        super(CongestedMFDFlowMotor, self).add_reservoir(res)
\ No newline at end of file
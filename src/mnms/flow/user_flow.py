@@ -1,10 +1,13 @@
-from typing import Dict, List, Optional
+from heapq import heappush, heappop
+from itertools import count
+from typing import Dict, List, Optional, Tuple
 
 import numpy as np
 
 
 from mnms.graph.layers import MultiLayerGraph
 from mnms.demand.user import User, UserState
+from mnms.flow.walking_state import WalkingUserArrays
 # from mnms.graph.core import ConnectionLink, TransitLink
 from mnms.time import Dt, Time
 from mnms.log import create_logger
@@ -21,11 +24,21 @@ class UserFlow(object):
         """
         self._graph: Optional[MultiLayerGraph] = None
         self.users:Dict[str, User] = dict()
-        self._walking: Dict = dict()
+        # The users by state, updated by the state transitions of the users, and the order in which the users
+        # were added so that the users changing state are processed in the same order as self.users
+        self._user_states: Dict[UserState, Dict[str, User]] = {state: dict() for state in UserState}
+        self._users_order: Dict[str, int] = dict()
+        self._users_counter = count()
+        self._walking: WalkingUserArrays = WalkingUserArrays()
         self._walk_speed: float = walk_speed
         self._tcurrent: Optional[Time] = None
 
-        self._waiting_answer: Dict[str, Time] = dict()
+        # Answer deadlines of the users waiting for an answer, the users are only looked at when their deadline
+        # expires. The heap entries whose order is not the one stored in _waiting_answer are outdated
+        self._waiting_answer: Dict[str, int] = dict()
+        self._answer_deadlines: List[Tuple[int, int, str]] = list()
+        self._answer_order = count()
+        self._elapsed_ticks: int = 0
 
         self._gnodes = None
 
@@ -38,6 +51,45 @@ class UserFlow(object):
     def update_time(self, dt:Dt):
         self._tcurrent = self._tcurrent.add_time(dt)
 
+    def add_user(self, user: User):
+        """
+        Add a User to the flow, its state transitions are then tracked by the flow
+
+        Args:
+            user: The user to add
+
+        Returns:
+            None
+        """
+        previous = self.users.get(user.id)
+        if previous is None:
+            self._users_order[user.id] = next(self._users_counter)
+        elif previous is not user:
+            self._detach_user(previous)
+        self.users[user.id] = user
+        user._state_buckets = self._user_states
+        self._user_states[user.state][user.id] = user
+
+    def remove_user(self, uid: str) -> Optional[User]:
+        """
+        Remove a User from the flow
+
+        Args:
+            uid: The id of the user
+
+        Returns:
+            The removed user, None if it was not in the flow
+        """
+        user = self.users.pop(uid, None)
+        if user is not None:
+            self._detach_user(user)
+            del self._users_order[uid]
+        return user
+
+    def _detach_user(self, user: User):
+        self._user_states[user.state].pop(user.id, None)
+        user._state_buckets = None
+
     def set_user_position(self, user: User):
         unode, dnode = user._current_link
         remaining_length = user._remaining_link_length
@@ -55,61 +107,30 @@ class UserFlow(object):
     def _user_walking(self, dt:Dt):
         finish_walk = list()
         finish_trip = list()
-        graph = self._graph.graph
-        for uid, remaining_length in self._walking.items():
-            dist_travelled = dt.to_seconds() * self._walk_speed
-            user = self.users[uid]
+        dist_travelled = dt.to_seconds() * self._walk_speed
+        for user, remaining_length in self._walking.advance(dist_travelled):
             upath = user.path.nodes
-            if remaining_length <= dist_travelled:
-                user.update_distance(remaining_length)
-                excess_dist = abs(remaining_length - dist_travelled)
-                user._remaining_link_length = 0
-                arrival_time = self._tcurrent.add_time(Dt(seconds=dt.to_seconds() - excess_dist / self._walk_speed))
-                next_node = upath[upath.index(user._current_node) + 1]
-                user._current_node = next_node
-                self.set_user_position(user)
-                if next_node == upath[-1]:
-                    # arrival_time = self._tcurrent.add_time(Dt(seconds=dt.to_seconds()-excess_dist/self._walk_speed))
-
-                    # next_node = upath[upath.index(user._current_node) + 1]
-                    # user._current_link = (user._current_node, next_node)
-                    # user._current_node = upath[-1]
-                    # user._remaining_link_length = 0
-
-                    # self.set_user_position(user)
-                    user.finish_trip(arrival_time)
-                    user.set_state_arrived()
-                    # user.notify(arrival_time.time)
-                    finish_trip.append(user)
-                else:
-                    # self.set_user_position(user)
-                    # log.info(remaining_length)
-                    user.set_state_stop()
-                    finish_walk.append(user)
-
-                user.notify(arrival_time.time)
-
+            user.update_distance(remaining_length)
+            excess_dist = abs(remaining_length - dist_travelled)
+            user._remaining_link_length = 0
+            arrival_time = self._tcurrent.add_time(Dt(seconds=dt.to_seconds() - excess_dist / self._walk_speed))
+            next_node = upath[user.path_cursor[0] + 1]
+            user._current_node = next_node
+            self.set_user_position(user)
+            if next_node == upath[-1]:
+                user.finish_trip(arrival_time)
+                user.set_state_arrived()
+                finish_trip.append(user)
             else:
-                self._walking[uid] = remaining_length - dist_travelled
-                user._remaining_link_length = remaining_length
-                self.set_user_position(user)
-                user.update_distance(dist_travelled)
-
-        for user in finish_walk:
-            # upath = user.path.nodes
-            # cnode = user._current_node
-            # cnode_ind = upath.index(cnode)
-            # user._current_node = graph.nodes[upath[cnode_ind+1]].id
-            # user._current_link = (user._current_node, upath[upath.index(user._current_node)+1])
-            # user._remaining_link_length = 0
-            del self._walking[user.id]
-            # self._transiting[user.id] = user
+                user.set_state_stop()
+                finish_walk.append(user)
+
+            user.notify(arrival_time.time)
 
         [self._request_user_vehicles(u) for u in finish_walk]
 
         for u in finish_trip:
-            del self.users[u.id]
-            del self._walking[u.id]
+            self.remove_user(u.id)
 
     # def _process_user(self):
     #     to_del = list()
@@ -149,14 +170,13 @@ class UserFlow(object):
             user._position = start_node_pos
 
             # Finding the mobility service associated and request vehicle
-            ind_node_start = upath.index(user._current_node)
-            for ilayer, (layer, slice_nodes) in enumerate(user.path.layers):
-                if slice_nodes.start <= ind_node_start < slice_nodes.stop:
-                    mservice_id = user.path.mobility_services[ilayer]
-                    mservice = self._graph.layers[layer].mobility_services[mservice_id]
-                    log.info(f"{user} request {mservice}")
-                    mservice.request_vehicle(user, upath[slice_nodes][-1])
-                    break
+            _, ilayer = user.path_cursor
+            if ilayer is not None:
+                layer, slice_nodes = user.path.layers[ilayer]
+                mservice_id = user.path.mobility_services[ilayer]
+                mservice = self._graph.layers[layer].mobility_services[mservice_id]
+                log.info(f"{user} request {mservice}")
+                mservice.request_vehicle(user, upath[slice_nodes][-1])
             else:
                 log.warning(f"No mobility service found for user {user}")
 
@@ -174,12 +194,13 @@ class UserFlow(object):
     def step(self, dt: Dt, new_users: List[User]):
         log.info(f"Step User Flow {self._tcurrent}")
         self._gnodes = self._graph.graph.nodes
+        self._walking.set_graph_nodes(self._gnodes)
 
         refused_user = self.check_user_waiting_answers(dt)
 
         for u in new_users:
             if u.path is not None:
-                self.users[u.id] = u
+                self.add_user(u)
 
         self.determine_user_states()
 
@@ -190,11 +211,13 @@ class UserFlow(object):
 
     def determine_user_states(self):
         to_del = list()
-        for u in self.users.values():
+        users_order = self._users_order
+        stopped_users = sorted(self._user_states[UserState.STOP].values(), key=lambda user: users_order[user.id])
+        for u in stopped_users:
             if u.state is UserState.STOP:
                 upath = u.path.nodes
                 cnode = u._current_node
-                cnode_ind = upath.index(cnode)
+                cnode_ind, _ = u.path_cursor
                 next_link = self._gnodes[cnode].adj[upath[cnode_ind + 1]]
                 u._position = self._gnodes[cnode].position
                 if u._current_node == upath[-1]:
@@ -202,45 +225,59 @@ class UserFlow(object):
                     u.finish_trip(self._tcurrent)
                     to_del.append(u.id)
                     u.set_state_arrived()
-                    self._walking.pop(u.id, None)
+                    self._walking.remove(u.id)
                     to_del.append(u.id)
                 elif next_link.label == "TRANSIT":
                     log.info(f"{u} enter connection on {next_link.id}")
                     u.set_state_walking()
-                    self._walking[u.id] = next_link.length
+                    self._walking.add(u, next_link.length)
                 else:
-                    self._walking.pop(u.id, None)
+                    self._walking.remove(u.id)
                     u.set_state_waiting_answer()
                     self._request_user_vehicles(u)
 
                 u.notify(self._tcurrent)
 
-            if u.state is UserState.WAITING_ANSWER:
-                self._waiting_answer.setdefault(u.id, u.response_dt.copy())
+                if u.state is UserState.WAITING_ANSWER:
+                    self._add_answer_deadline(u)
 
         for uid in to_del:
-            self.users.pop(uid)
+            self.remove_user(uid)
+
+    def _add_answer_deadline(self, user: User):
+        order = next(self._answer_order)
+        self._waiting_answer[user.id] = order
+        heappush(self._answer_deadlines, (self._elapsed_ticks + user.response_dt.ticks, order, user.id))
 
     def check_user_waiting_answers(self, dt: Dt):
-        to_del = list()
-        refused_users = list()
+        """
+        Refuse the users whose answer deadline expired during the step
 
-        for uid, time in self._waiting_answer.items():
-            if self.users[uid].state is UserState.WAITING_ANSWER:
-                new_time = time.to_seconds() - dt.to_seconds()
-                if new_time < 0:
-                    log.info(f"{uid} waited answer to long")
-                    refused_users.append(self.users[uid])
-                    self.users[uid].set_state_stop()
-                    self.users[uid].notify(self._tcurrent)
-                    del self.users[uid]
-                    to_del.append(uid)
-                else:
-                    self._waiting_answer[uid] = Time.from_seconds(new_time)
-            else:
-                to_del.append(uid)
+        Args:
+            dt: The time step
 
-        for uid in to_del:
-            self._waiting_answer.pop(uid)
+        Returns:
+            The refused users, in the order they started to wait for an answer
+        """
+        self._elapsed_ticks += dt.ticks
+        deadlines = self._answer_deadlines
+
+        expired = list()
+        while deadlines and deadlines[0][0] < self._elapsed_ticks:
+            _, order, uid = heappop(deadlines)
+            if self._waiting_answer.get(uid) == order:
+                del self._waiting_answer[uid]
+                user = self.users.get(uid)
+                if user is not None and user.state is UserState.WAITING_ANSWER:
+                    expired.append((order, user))
+        expired.sort(key=lambda item: item[0])
+
+        refused_users = list()
+        for _, user in expired:
+            log.info(f"{user.id} waited answer to long")
+            refused_users.append(user)
+            user.set_state_stop()
+            user.notify(self._tcurrent)
+            self.remove_user(user.id)
 
         return refused_users
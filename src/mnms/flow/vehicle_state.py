@@ -0,0 +1,195 @@
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from mnms.log import create_logger
+from mnms.vehicles.veh_type import Vehicle
+
+log = create_logger(__name__)
+
+
+class VehicleStateArrays(object):
+    def __init__(self, graph_nodes, link_zone: Callable[[Tuple[str, str]], int]):
+        """
+        Struct of arrays holding the state of the moving vehicles during a flow step. The zones and speeds of the
+        vehicles are computed in bulk, and the vehicles that stay on their current link are advanced with one
+        vectorized update, the other ones are left to the per vehicle logic of the flow motor
+
+        Args:
+            graph_nodes: The nodes of the graph on which the vehicles move
+            link_zone: Return the zone column of a link, -1 if the zone of the vehicles on this link depends on
+                their position
+        """
+        self._graph_nodes = graph_nodes
+        self._link_zone_function = link_zone
+
+        # Geometry and zone of the links, indexed by the interned link index
+        self._link_index: Dict[Tuple[str, str], int] = dict()
+        self._links: List[Tuple[str, str]] = list()
+        self._link_upstream_position: List[np.ndarray] = list()
+        self._link_direction: List[np.ndarray] = list()
+        self._link_norm: List[float] = list()
+        self._link_zone: List[int] = list()
+        self._link_arrays: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]] = None
+
+        # Vehicle types, indexed by the interned type index
+        self._type_index: Dict[type, int] = dict()
+        self.vehicle_types: List[str] = list()
+
+        # State of the loaded vehicles
+        self.vehicles: List[Vehicle] = list()
+        self.link = np.empty(0, dtype=np.int64)
+        self.vehicle_type = np.empty(0, dtype=np.int64)
+        self.zone = np.empty(0, dtype=np.int64)
+        self.remaining_length = np.empty(0)
+        self.speed = np.empty(0)
+        self.distance = np.empty(0)
+        self.position = np.empty((0, 2))
+
+    @property
+    def number(self):
+        return len(self.vehicles)
+
+    def link_index(self, link: Tuple[str, str]) -> int:
+        """
+        Return the index of a link, the geometry and zone of the link are computed the first time it is seen
+
+        Args:
+            link: The upstream and downstream nodes of the link
+
+        Returns:
+            The index of the link
+        """
+        ind = self._link_index.get(link)
+        if ind is None:
+            unode, dnode = link
+            unode_pos = np.array(self._graph_nodes[unode].position, dtype=float)
+            dnode_pos = np.array(self._graph_nodes[dnode].position, dtype=float)
+            direction = dnode_pos - unode_pos
+            norm_direction = np.linalg.norm(direction)
+
+            ind = len(self._link_norm)
+            self._link_index[link] = ind
+            self._links.append(link)
+            self._link_upstream_position.append(unode_pos)
+            self._link_direction.append(direction / norm_direction if norm_direction > 0 else direction)
+            self._link_norm.append(norm_direction)
+            self._link_zone.append(self._link_zone_function(link))
+            self._link_arrays = None
+        return ind
+
+    def reset_link_zones(self):
+        """
+        Compute again the zone of the links, when the reservoirs of the flow motor change
+        """
+        self._link_zone = [self._link_zone_function(link) for link in self._links]
+        self._link_arrays = None
+
+    def type_index(self, vehicle: Vehicle) -> int:
+        """
+        Return the index of the type of a vehicle
+
+        Args:
+            vehicle: The vehicle
+
+        Returns:
+            The index of its type
+        """
+        ind = self._type_index.get(type(vehicle))
+        if ind is None:
+            ind = len(self.vehicle_types)
+            self._type_index[type(vehicle)] = ind
+            self.vehicle_types.append(vehicle.type.upper())
+        return ind
+
+    def _get_link_arrays(self):
+        if self._link_arrays is None:
+            self._link_arrays = (np.array(self._link_upstream_position).reshape(-1, 2),
+                                 np.array(self._link_direction).reshape(-1, 2),
+                                 np.array(self._link_norm, dtype=float),
+                                 np.array(self._link_zone, dtype=np.int64))
+        return self._link_arrays
+
+    def load(self, vehicles: List[Vehicle]):
+        """
+        Gather the state of the vehicles in the arrays, the zone of a vehicle is the one of its link and -1 if it
+        must be computed from its position
+
+        Args:
+            vehicles: The vehicles to load
+        """
+        nb_veh = len(vehicles)
+        links = np.empty(nb_veh, dtype=np.int64)
+        vehicle_type = np.empty(nb_veh, dtype=np.int64)
+        remaining_length = np.empty(nb_veh)
+
+        for i, veh in enumerate(vehicles):
+            current_link = veh._current_link
+            veh_remaining_length = veh._remaining_link_length
+            vehicle_type[i] = self.type_index(veh)
+            if current_link is None or veh_remaining_length is None:
+                # Vehicle that cannot be moved in batch, NaN makes it fall back to the per vehicle logic
+                links[i] = -1
+                remaining_length[i] = np.nan
+            else:
+                links[i] = self.link_index(current_link)
+                remaining_length[i] = veh_remaining_length
+
+        self.vehicles = vehicles
+        self.link = links
+        self.vehicle_type = vehicle_type
+        self.remaining_length = remaining_length
+        if self._link_norm:
+            self.zone = np.where(links >= 0, self._get_link_arrays()[3][links], -1)
+        else:
+            self.zone = np.full(nb_veh, -1, dtype=np.int64)
+        self.speed = np.full(nb_veh, np.nan)
+        self.distance = np.zeros(nb_veh)
+        self.position = np.empty((nb_veh, 2))
+
+    def count(self, nb_zones: int) -> np.ndarray:
+        """
+        Count the loaded vehicles by zone and type, all the zones must be known
+
+        Args:
+            nb_zones: The number of zone columns
+
+        Returns:
+            The (zones x types) matrix of the number of vehicles
+        """
+        counts = np.zeros((nb_zones, len(self.vehicle_types)), dtype=np.int64)
+        np.add.at(counts, (self.zone, self.vehicle_type), 1)
+        return counts
+
+    def set_speeds(self, speeds: np.ndarray):
+        """
+        Set the speed of the loaded vehicles from the speed of each zone and type, a NaN speed leaves the
+        vehicle to the per vehicle logic
+
+        Args:
+            speeds: The (zones x types) matrix of speeds
+        """
+        self.speed = speeds[self.zone, self.vehicle_type]
+
+    def advance(self, dt: float) -> np.ndarray:
+        """
+        Move all the loaded vehicles that do not reach the end of their current link during dt
+
+        Args:
+            dt: The duration of the move in seconds
+
+        Returns:
+            The mask of the vehicles that have been moved
+        """
+        dist_travelled = dt * self.speed
+        on_link = dist_travelled <= self.remaining_length
+
+        self.remaining_length = np.where(on_link, self.remaining_length - dist_travelled, self.remaining_length)
+        self.distance = np.where(on_link, dist_travelled, 0.)
+
+        if self.number > 0 and self._link_norm:
+            upstream_position, direction, norm, _ = self._get_link_arrays()
+            travelled = np.where(norm[self.link] > 0, norm[self.link] - self.remaining_length, 0.)
+            self.position = upstream_position[self.link] + direction[self.link] * travelled[:, None]
+
+        return on_link
@@ -0,0 +1,192 @@
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from mnms.demand.user import User
+from mnms.log import create_logger
+
+log = create_logger(__name__)
+
+
+class WalkingUserArrays(object):
+    def __init__(self, graph_nodes=None):
+        """
+        Struct of arrays holding the state of the walking users. All the users are advanced with one vectorized
+        update per flow step, only the users reaching the end of their walk are handed back to the per user logic
+        of the user flow. While a user walks, its position and distance are read from the arrays
+
+        Args:
+            graph_nodes: The nodes of the graph on which the users walk
+        """
+        self._graph_nodes = graph_nodes
+
+        # Geometry of the links, indexed by the interned link index
+        self._link_index: Dict[Tuple[str, str], int] = dict()
+        self._link_upstream_position: List[np.ndarray] = list()
+        self._link_direction: List[np.ndarray] = list()
+        self._link_norm: List[float] = list()
+        self._link_arrays: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None
+
+        # State of the walking users, stored in the first rows of arrays whose capacity is doubled when full. A
+        # stopped walk is replaced by the last row, the start sequence keeps the order in which the users started
+        self.users: List[User] = list()
+        self._user_index: Dict[str, int] = dict()
+        self._start_counter = 0
+        self._start = np.empty(0, dtype=np.int64)
+        self._link = np.empty(0, dtype=np.int64)
+        self._remaining_length = np.empty(0)
+        # Remaining length stored on the user, the one at the beginning of the last step as in the per user walk
+        self._link_remaining_length = np.empty(0)
+        self._distance = np.empty(0)
+        self._position = np.empty((0, 2))
+
+    def __len__(self):
+        return len(self.users)
+
+    def __contains__(self, uid: str):
+        return uid in self._user_index
+
+    def set_graph_nodes(self, graph_nodes):
+        self._graph_nodes = graph_nodes
+
+    def _get_link_index(self, link: Tuple[str, str]) -> int:
+        ind = self._link_index.get(link)
+        if ind is None:
+            unode, dnode = link
+            unode_pos = np.array(self._graph_nodes[unode].position)
+            dnode_pos = np.array(self._graph_nodes[dnode].position)
+            direction = dnode_pos - unode_pos
+            norm_direction = np.linalg.norm(direction)
+
+            ind = len(self._link_norm)
+            self._link_index[link] = ind
+            self._link_upstream_position.append(unode_pos)
+            self._link_direction.append(direction / norm_direction if norm_direction > 0 else direction)
+            self._link_norm.append(norm_direction)
+            self._link_arrays = None
+        return ind
+
+    def _get_link_arrays(self):
+        if self._link_arrays is None:
+            self._link_arrays = (np.array(self._link_upstream_position, dtype=float).reshape(-1, 2),
+                                 np.array(self._link_direction, dtype=float).reshape(-1, 2),
+                                 np.array(self._link_norm, dtype=float))
+        return self._link_arrays
+
+    def _grow(self):
+        capacity = max(2 * len(self._start), 16)
+        size = len(self.users)
+        for name in ("_start", "_link", "_remaining_length", "_link_remaining_length", "_distance", "_position"):
+            array = getattr(self, name)
+            new_array = np.empty((capacity,) + array.shape[1:], dtype=array.dtype)
+            new_array[:size] = array[:size]
+            setattr(self, name, new_array)
+
+    def add(self, user: User, length: float):
+        """
+        Start the walk of a user
+
+        Args:
+            user: The user
+            length: The length to walk
+        """
+        ind = self._user_index.get(user.id)
+        if ind is not None:
+            self._remaining_length[ind] = length
+            return
+
+        ind = len(self.users)
+        if ind == len(self._start):
+            self._grow()
+        position = user.position if user.position is not None else (np.nan, np.nan)
+        remaining_length = user._remaining_link_length
+        self._user_index[user.id] = ind
+        self.users.append(user)
+        self._start[ind] = self._start_counter
+        self._start_counter += 1
+        self._link[ind] = self._get_link_index(user._current_link)
+        self._remaining_length[ind] = length
+        self._link_remaining_length[ind] = np.nan if remaining_length is None else remaining_length
+        self._distance[ind] = user.distance
+        self._position[ind] = position
+        user._walking_state = self
+
+    def remove(self, uid: str):
+        """
+        Stop the walk of a user, if it is walking
+
+        Args:
+            uid: The id of the user
+        """
+        ind = self._user_index.get(uid)
+        if ind is not None:
+            self._remove_index(ind)
+
+    def _remove_index(self, ind: int):
+        user = self.users[ind]
+        user._position = self.user_position(user)
+        user._distance = float(self._distance[ind])
+        remaining_length = self._link_remaining_length[ind]
+        user._remaining_link_length = None if np.isnan(remaining_length) else float(remaining_length)
+        user._walking_state = None
+        del self._user_index[user.id]
+
+        last = len(self.users) - 1
+        if ind != last:
+            last_user = self.users[last]
+            self.users[ind] = last_user
+            self._user_index[last_user.id] = ind
+            self._start[ind] = self._start[last]
+            self._link[ind] = self._link[last]
+            self._remaining_length[ind] = self._remaining_length[last]
+            self._link_remaining_length[ind] = self._link_remaining_length[last]
+            self._distance[ind] = self._distance[last]
+            self._position[ind] = self._position[last]
+        self.users.pop()
+
+    def user_position(self, user: User):
+        position = self._position[self._user_index[user.id]]
+        return None if np.isnan(position[0]) else position.copy()
+
+    def user_distance(self, user: User) -> float:
+        return float(self._distance[self._user_index[user.id]])
+
+    def advance(self, dist_travelled: float) -> List[Tuple[User, float]]:
+        """
+        Move all the walking users, the users reaching the end of their walk are removed from the arrays
+
+        Args:
+            dist_travelled: The distance walked during the step
+
+        Returns:
+            The users reaching the end of their walk with the length they had left to walk, in the order they
+            started to walk
+        """
+        size = len(self.users)
+        if size == 0:
+            return []
+
+        link = self._link[:size]
+        remaining_length = self._remaining_length[:size]
+        distance = self._distance[:size]
+        position = self._position[:size]
+        walking = remaining_length > dist_travelled
+
+        upstream_position, direction, norm = self._get_link_arrays()
+        link_norm = norm[link]
+        moved = walking & (link_norm > 0)
+        travelled = link_norm - remaining_length
+        position[moved] = upstream_position[link[moved]] + direction[link[moved]] * travelled[moved, None]
+        distance[walking] += dist_travelled
+        self._link_remaining_length[:size][walking] = remaining_length[walking]
+        remaining_length[walking] -= dist_travelled
+
+        if walking.all():
+            return []
+        finished_ind = np.flatnonzero(~walking)
+        finished_ind = finished_ind[np.argsort(self._start[finished_ind])]
+        finished = [(self.users[i], float(remaining_length[i])) for i in finished_ind]
+        # Removed from the last row, so that a row moved by a removal is never a finished one
+        for i in sorted(finished_ind, reverse=True):
+            self._remove_index(int(i))
+        return finished
@@ -2,6 +2,7 @@ from abc import abstractmethod
 from collections import defaultdict
 from typing import Optional, Dict, List, Type, Callable
 
+import numpy as np
 from hipop.graph import OrientedGraph
 
 from mnms.graph.road import RoadDescriptor
@@ -14,9 +15,47 @@ from mnms.vehicles.veh_type import Vehicle
 class CostFunctionLayer(object):
     def __init__(self):
         self._costs_functions: Dict[str, Dict[str, Callable]] = defaultdict(dict)
+        self._batch_costs_functions: Dict[str, Dict[str, Callable]] = defaultdict(dict)
 
-    def add_cost_function(self, mobility_service: str, cost_name: str, cost_function: Callable[[Dict[str, float]], float]):
-        self._costs_functions[mobility_service][cost_name] = cost_function
+    def add_cost_function(self, mobility_service: str, cost_name: str, cost_function: Callable[[Dict[str, float]], float], batch: bool = False):
+        """
+        Add a cost function computed for each link of the layer
+
+        Args:
+            mobility_service: The mobility service the cost is defined for
+            cost_name: The name of the cost
+            cost_function: The function computing the cost. If batch is False, it is called for each link as
+                `f(mlgraph, link, costs)`. If batch is True, it is called once for all the links as
+                `f(mlgraph, link_ids, costs)` with costs a dict of arrays ('length', 'speed', 'travel_time'
+                and the batch costs already computed) and must return an array of costs
+            batch: If True, the cost function is a batch cost function
+        """
+        if batch:
+            self._batch_costs_functions[mobility_service][cost_name] = cost_function
+        else:
+            self._costs_functions[mobility_service][cost_name] = cost_function
+
+    def compute_batch_costs(self, mlgraph, link_ids: List[str], costs: Dict[str, np.ndarray]) -> Dict[str, Dict[str, np.ndarray]]:
+        """
+        Compute the batch costs of a set of links of the layer
+
+        Args:
+            mlgraph: The MultiLayerGraph
+            link_ids: The ids of the links
+            costs: The arrays of the costs of the links ('length', 'speed' and 'travel_time')
+
+        Returns:
+            The arrays of the batch costs by mobility service and cost name
+        """
+        batch_costs = dict()
+        for mservice, cost_funcs in self._batch_costs_functions.items():
+            service_costs = dict(costs)
+            batch_costs[mservice] = dict()
+            for cost_name, cost_f in cost_funcs.items():
+                values = np.broadcast_to(np.asarray(cost_f(mlgraph, link_ids, service_costs), dtype=float), (len(link_ids),))
+                service_costs[cost_name] = values
+                batch_costs[mservice][cost_name] = values
+        return batch_costs
 
 
 class AbstractLayer(CostFunctionLayer):
@@ -25,6 +25,8 @@ class DynamicSpaceSharing(object):
 
         self.cost: Optional[str] = None
         self.banned_links: Dict[str, BannedLink] = dict()
+        # The decision model whose cached paths are invalidated when a link is banned or unbanned
+        self.decision_model: Optional["AbstractDecisionModel"] = None
         self._dt = 0
 
         self._flow_step_counter = 0
@@ -46,7 +48,7 @@ class DynamicSpaceSharing(object):
         self.graph.graph.update_link_costs(lid, costs)
         layer = self.graph.mapping_layer_services[mobility_service]
         layer.graph.links[lid].update_costs(costs)
-
+        self.invalidate_path_caches(lid)
 
         link_border = (link.upstream, link.downstream)
 
@@ -81,6 +83,21 @@ class DynamicSpaceSharing(object):
         self.graph.graph.update_link_costs(lid, costs)
         layer = self.graph.mapping_layer_services[self.banned_links[lid].mobility_service]
         layer.graph.links[lid].update_costs(costs)
+        self.invalidate_path_caches(lid)
+
+    def invalidate_path_caches(self, lid: str):
+        """
+        Drop the shortest paths cached by the decision model and the mobility services that go through a link
+        whose cost changed
+
+        Args:
+            lid: The id of the link
+        """
+        if self.decision_model is not None:
+            self.decision_model.invalidate_path_cache({lid})
+        for layer in self.graph.layers.values():
+            for mservice in layer.mobility_services.values():
+                mservice.invalidate_path_cache({lid})
 
     def update(self, tcurrent: Time, vehicles: List[Vehicle]) -> List[Tuple[Vehicle, VehicleActivity]]:
         to_del = list()
@@ -13,6 +13,7 @@ from mnms.log import create_logger
 from mnms.mobility_service.abstract import AbstractMobilityService
 from mnms.mobility_service.public_transport import PublicTransportMobilityService
 from mnms.time import TimeTable
+from mnms.tools.geometry import GridIndex
 from mnms.vehicles.veh_type import Vehicle, Car, Bus
 
 log = create_logger(__name__)
@@ -176,13 +177,22 @@ class PublicTransportLayer(AbstractLayer):
                                     sections[i][::-1])
 
     def initialize(self):
+        gnodes = self.graph.nodes
         for lid, line in self.lines.items():
             timetable = line['table']
+            line_nodes = line['nodes']
+            # Distance from the first stop of the line to each of its stops
+            cumulative_lengths = np.cumsum([0] + [gnodes[unode].adj[dnode].length
+                                                  for unode, dnode in zip(line_nodes[:-1], line_nodes[1:])])
             for service in self.mobility_services.values():
                 timetable_iter = iter(timetable.table)
                 service._timetable_iter[lid] = timetable_iter
                 service._current_time_table[lid] = next(timetable_iter)
                 service._next_time_table[lid] = next(timetable_iter)
+                service._line_cumulative_lengths[lid] = cumulative_lengths
+                for ind, nid in enumerate(line_nodes):
+                    # The terminus of a loop line is listed twice, its first occurrence is kept
+                    service._stop_lines.setdefault(nid, (lid, ind))
 
     def __dump__(self):
         return {'ID': self.id,
@@ -230,15 +240,50 @@ class OriginDestinationLayer(object):
         self.destinations = dict()
         self.id = "ODLAYER"
 
+        self._origins_index: Optional[GridIndex] = None
+        self._destinations_index: Optional[GridIndex] = None
+
     def create_origin_node(self, nid, pos: np.ndarray):
         # new_node = Node(nid, pos[0], pos[1], self.id)
 
         self.origins[nid] = pos
+        self._origins_index = None
 
     def create_destination_node(self, nid, pos: np.ndarray):
         # new_node = Node(nid, pos[0], pos[1], self.id)
 
         self.destinations[nid] = pos
+        self._destinations_index = None
+
+    def nearest_origins(self, positions) -> List[str]:
+        """
+        Snap positions to their nearest origin node
+
+        Args:
+            positions: The positions to snap
+
+        Returns:
+            The id of the nearest origin of each position
+        """
+        if self._origins_index is None or len(self._origins_index) != len(self.origins):
+            self._origins_index = GridIndex([pos for pos in self.origins.values()])
+        origins_id = list(self.origins.keys())
+        return [origins_id[i] for i in self._origins_index.nearest(positions).tolist()]
+
+    def nearest_destinations(self, positions) -> List[str]:
+        """
+        Snap positions to their nearest destination node
+
+        Args:
+            positions: The positions to snap
+
+        Returns:
+            The id of the nearest destination of each position
+        """
+        if self._destinations_index is None or len(self._destinations_index) != len(self.destinations):
+            self._destinations_index = GridIndex([pos for pos in self.destinations.values()])
+        destinations_id = list(self.destinations.keys())
+        return [destinations_id[i] for i in self._destinations_index.nearest(positions).tolist()]
 
     def __dump__(self):
         return {'ORIGINS': {node.id: node.position for node in self.origins.values()},
@@ -353,42 +398,37 @@ class MultiLayerGraph(object):
     def connect_origin_destination_layer(self, connection_distance: float):
         assert self.odlayer is not None
 
-        _norm = np.linalg.norm
-
         odlayer_nodes = set()
         odlayer_nodes.update(self.odlayer.origins.keys())
         odlayer_nodes.update(self.odlayer.destinations.keys())
 
-        graph_node_ids = np.array([nid for nid in self.graph.nodes])
-        graph_node_pos = np.array([n.position for n in self.graph.nodes.values()])
-
+        # Index the nodes of the other layers, graph.nodes is only fetched once
         graph_nodes = self.graph.nodes
-        for nid in self.odlayer.origins:
-            node = graph_nodes[nid]
-            npos = np.array(node.position)
-            dist_nodes = _norm(graph_node_pos-npos, axis=1)
-            mask = dist_nodes < connection_distance
-            for layer_nid, dist in zip(graph_node_ids[mask], dist_nodes[mask]):
-                if layer_nid not in odlayer_nodes:
-                    lid = f"{nid}_{layer_nid}"
-                    self.graph.add_link(lid, nid, layer_nid, dist, {"WALK": {'length': dist}}, "TRANSIT")
-                    # Add the transit link into the transit layer
-                    link_olayer_id = self.graph.nodes[nid].label
-                    link_dlayer_id = self.graph.nodes[layer_nid].label
-                    self.transitlayer.add_link(lid, link_olayer_id, link_dlayer_id)
-        for nid in self.odlayer.destinations:
-            node = graph_nodes[nid]
-            npos = np.array(node.position)
-            dist_nodes = _norm(graph_node_pos-npos, axis=1)
-            mask = dist_nodes < connection_distance
-            for layer_nid, dist in zip(graph_node_ids[mask], dist_nodes[mask]):
-                if layer_nid not in odlayer_nodes:
-                    lid = f"{layer_nid}_{nid}"
-                    self.graph.add_link(lid, layer_nid, nid, dist, {"WALK": {'length': dist}}, "TRANSIT")
-                    # Add the transit link into the transit layer
-                    link_olayer_id = self.graph.nodes[layer_nid].label
-                    link_dlayer_id = self.graph.nodes[nid].label
-                    self.transitlayer.add_link(lid, link_olayer_id, link_dlayer_id)
+        layer_node_ids = [nid for nid in graph_nodes if nid not in odlayer_nodes]
+        layer_node_labels = [graph_nodes[nid].label for nid in layer_node_ids]
+        index = GridIndex([graph_nodes[nid].position for nid in layer_node_ids], cell_size=connection_distance)
+
+        # Gather the transit links (id, upstream, downstream, length, upstream label, downstream label)
+        links = list()
+        origins = list(self.odlayer.origins)
+        origins_neighbors = index.within([graph_nodes[nid].position for nid in origins], connection_distance) if origins else []
+        for nid, (neighbors, dists) in zip(origins, origins_neighbors):
+            label = graph_nodes[nid].label
+            for i, dist in zip(neighbors.tolist(), dists.tolist()):
+                layer_nid = layer_node_ids[i]
+                links.append((f"{nid}_{layer_nid}", nid, layer_nid, dist, label, layer_node_labels[i]))
+        destinations = list(self.odlayer.destinations)
+        destinations_neighbors = index.within([graph_nodes[nid].position for nid in destinations], connection_distance) if destinations else []
+        for nid, (neighbors, dists) in zip(destinations, destinations_neighbors):
+            label = graph_nodes[nid].label
+            for i, dist in zip(neighbors.tolist(), dists.tolist()):
+                layer_nid = layer_node_ids[i]
+                links.append((f"{layer_nid}_{nid}", layer_nid, nid, dist, layer_node_labels[i], label))
+
+        for lid, upstream, downstream, dist, link_olayer_id, link_dlayer_id in links:
+            self.graph.add_link(lid, upstream, downstream, dist, {"WALK": {'length': dist}}, "TRANSIT")
+            # Add the transit link into the transit layer
+            self.transitlayer.add_link(lid, link_olayer_id, link_dlayer_id)
 
     def construct_layer_service_mapping(self):
         for layer in self.layers.values():
@@ -404,7 +444,17 @@ class MultiLayerGraph(object):
         link_dlayer_id = self.graph.nodes[downstream].label
         self.transitlayer.add_link(lid, link_olayer_id, link_dlayer_id)
 
-    def add_cost_function(self, layer_id: str, cost_name: str, cost_function: Callable, mobility_service: Optional[str] = None):
+    def add_cost_function(self, layer_id: str, cost_name: str, cost_function: Callable, mobility_service: Optional[str] = None, batch: bool = False):
+        """
+        Add a cost function on a layer
+
+        Args:
+            layer_id: The id of the layer, 'TRANSIT' for the transit links
+            cost_name: The name of the cost
+            cost_function: The function computing the cost, see `CostFunctionLayer.add_cost_function`
+            mobility_service: The mobility service the cost is defined for, all the services of the layer if None
+            batch: If True, the cost function is computed for all the links of the layer at once
+        """
         # Retrieve layer
         if layer_id == 'TRANSIT':
             layer = self.transitlayer
@@ -415,10 +465,10 @@ class MultiLayerGraph(object):
 
         # Add cost function on layer
         if mobility_service is not None:
-            layer.add_cost_function(mobility_service, cost_name, cost_function)
+            layer.add_cost_function(mobility_service, cost_name, cost_function, batch)
         else:
             for mservice in mservices:
-                layer.add_cost_function(mservice, cost_name, cost_function)
+                layer.add_cost_function(mservice, cost_name, cost_function, batch)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,132 @@
+from heapq import heappush, heappop
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from hipop.graph import Node, OrientedGraph
+
+
+class ReverseShortestPathTree(object):
+    def __init__(self,
+                 graph: OrientedGraph,
+                 target: Union[str, Iterable[str]],
+                 cost: str,
+                 layer_id: str,
+                 service_id: str,
+                 max_cost: float = float('inf'),
+                 nodes: Optional[Dict[str, Node]] = None):
+        """
+        Shortest path tree towards a target node, computed with a reverse Dijkstra restricted to the links of a
+        layer. The tree is only expanded on demand, up to the requested nodes or the maximum cost, so that one
+        search can be shared by all the sources evaluated for the same target. With several target nodes, each
+        source is linked to its nearest target
+
+        Args:
+            graph: The graph
+            target: The target node, or the target nodes
+            cost: The name of the cost to minimize
+            layer_id: The id of the layer whose links can be used
+            service_id: The mobility service whose costs are used
+            max_cost: The search is not expanded beyond this cost
+            nodes: The nodes of the graph, to avoid building them again
+        """
+        self.target: Union[str, Iterable[str]] = target
+        self.max_cost: float = max_cost
+
+        targets = [target] if isinstance(target, str) else list(target)
+
+        self._nodes: Dict[str, Node] = graph.nodes if nodes is None else nodes
+        self._cost: str = cost
+        self._layer_id: str = layer_id
+        self._service_id: str = service_id
+
+        # The search runs on the states (node, next node of the path), so that the movements excluded at a node
+        # are checked as in dijkstra. The targets have no next node, written as an empty string
+        self._state_costs: Dict[Tuple[str, str], float] = {(t, ''): 0. for t in targets}
+        self._next_states: Dict[Tuple[str, str], Optional[Tuple[str, str]]] = {(t, ''): None for t in targets}
+        self._settled: Set[Tuple[str, str]] = set()
+        self._heap = [(0., t, '') for t in sorted(targets)]
+
+        # Cost and first state of the settled nodes
+        self._costs: Dict[str, float] = dict()
+        self._node_states: Dict[str, Tuple[str, str]] = dict()
+
+    def _expand(self, node: str):
+        heap = self._heap
+        state_costs = self._state_costs
+        while heap and node not in self._costs:
+            cost, current, successor = heap[0]
+            if cost > self.max_cost:
+                break
+            heappop(heap)
+            state = (current, successor)
+            if state in self._settled:
+                continue
+            self._settled.add(state)
+            if current not in self._costs:
+                self._costs[current] = cost
+                self._node_states[current] = state
+
+            current_node = self._nodes[current]
+            exclude_movements = current_node.exclude_movements if successor else None
+            for upstream, link in current_node.radj.items():
+                if link.label != self._layer_id:
+                    continue
+                if exclude_movements and successor in exclude_movements.get(upstream, ()):
+                    continue
+                new_state = (upstream, current)
+                new_cost = cost + link.costs[self._service_id][self._cost]
+                if new_cost < state_costs.get(new_state, float('inf')):
+                    state_costs[new_state] = new_cost
+                    self._next_states[new_state] = state
+                    heappush(heap, (new_cost, upstream, current))
+
+    def cost(self, source: str) -> float:
+        """
+        Cost of the shortest path from a source to the target
+
+        Args:
+            source: The source node
+
+        Returns:
+            The cost, infinite if the target cannot be reached within the maximum cost
+        """
+        self._expand(source)
+        return self._costs.get(source, float('inf'))
+
+    def path(self, source: str) -> List[str]:
+        """
+        Shortest path from a source to the target
+
+        Args:
+            source: The source node
+
+        Returns:
+            The nodes of the path, empty if the source is the target or if the target cannot be reached within
+            the maximum cost
+        """
+        if self.cost(source) == float('inf'):
+            return []
+        state = self._node_states[source]
+        if not state[1]:
+            return []
+        path = [source]
+        while state[1]:
+            state = self._next_states[state]
+            path.append(state[0])
+        return path
+
+    def root(self, source: str) -> Optional[str]:
+        """
+        Target reached by the shortest path from a source
+
+        Args:
+            source: The source node
+
+        Returns:
+            The target, None if no target can be reached within the maximum cost
+        """
+        if self.cost(source) == float('inf'):
+            return None
+        state = self._node_states[source]
+        while state[1]:
+            state = self._next_states[state]
+        return state[0]
@@ -1,9 +1,12 @@
 from abc import ABC, abstractmethod, ABCMeta
-from typing import List, Tuple, Optional, Dict
+from typing import List, Tuple, Optional, Dict, Set
+
+from hipop.graph import Node
 
 from mnms.log import create_logger
 from mnms.demand.horizon import AbstractDemandHorizon
 from mnms.demand.user import User
+from mnms.graph.shortest_path import ReverseShortestPathTree
 from mnms.tools.cost import create_service_costs
 from mnms.time import Time, Dt
 from mnms.vehicles.fleet import FleetManager
@@ -13,11 +16,16 @@ log = create_logger(__name__)
 
 
 class AbstractMobilityService(ABC):
+    # Services matching all the buffered users at once implement batch_request and set this flag
+    supports_batch_matching: bool = False
+
     def __init__(self,
                  _id: str,
                  veh_capacity: int,
                  dt_matching: int,
-                 dt_periodic_maintenance: int):
+                 dt_periodic_maintenance: int,
+                 pickup_tree: bool = False,
+                 batch_matching: bool = False):
         """
         Interface for edfining a new type of mobility serivce
 
@@ -26,6 +34,10 @@ class AbstractMobilityService(ABC):
             veh_capacity: the capacity of the vehicles
             dt_matching: the time of accumulation of request before matching
             dt_periodic_maintenance: The dt of launching peridodic maintenance
+            pickup_tree: If True, the pickup paths of the vehicles evaluated for a user are read from one reverse
+                search from the user node, they are the same as with one dijkstra per vehicle
+            batch_matching: If True, the buffered users are matched all at once with `batch_request` instead of
+                one after the other with `request`, only for services supporting batch matching
         """
         self._id: str = _id
         self.layer: "AbstractLayer" = None
@@ -43,6 +55,15 @@ class AbstractMobilityService(ABC):
 
         self._cache_request_vehicles = dict()
 
+        self._pickup_tree: bool = pickup_tree
+        self._pickup_trees: Dict[str, ReverseShortestPathTree] = dict()
+        self._pickup_nodes: Optional[Dict[str, Node]] = None
+
+        if batch_matching and (veh_capacity > 1 or not self.supports_batch_matching):
+            raise ValueError(f"{self.__class__.__name__} with vehicles of capacity {veh_capacity} does not support "
+                             f"batch matching")
+        self._batch_matching: bool = batch_matching
+
     def set_time(self, time:Time):
         self._tcurrent = time.copy()
 
@@ -70,6 +91,33 @@ class AbstractMobilityService(ABC):
             veh_path.append((key, link_length))
         return veh_path
 
+    def get_pickup_tree(self, user: User) -> ReverseShortestPathTree:
+        """
+        Get the reverse shortest path tree towards the current node of a user, it is shared by all the vehicles
+        evaluated for this user during the matching
+
+        Args:
+            user: The user to pick up
+
+        Returns:
+            The tree, bounded by the pickup dt of the user only in batch matching, where the vehicles that cannot
+            pick up the user in time are not assigned to it
+        """
+        tree = self._pickup_trees.get(user.id)
+        if tree is None or tree.target != user.current_node:
+            if self._pickup_nodes is None:
+                self._pickup_nodes = self.graph.nodes
+            tree = ReverseShortestPathTree(self.graph,
+                                           user.current_node,
+                                           'travel_time',
+                                           self.layer.id,
+                                           self.id,
+                                           max_cost=user.pickup_dt[self.id].to_seconds() if self._batch_matching
+                                           else float('inf'),
+                                           nodes=self._pickup_nodes)
+            self._pickup_trees[user.id] = tree
+        return tree
+
     def service_level_costs(self, nodes:List[str]) -> dict:
         """
         Must return a dict of costs representing the cost of the service computed from a path
@@ -101,28 +149,63 @@ class AbstractMobilityService(ABC):
         if self._counter_matching == self._dt_matching:
             self._counter_matching = 0
 
-            for uid, (user, drop_node) in self._user_buffer.items():
-                service_dt = self.request(user, drop_node)
-                if user.pickup_dt[self.id] > service_dt:
-                    self.matching(user, drop_node)
-                else:
-                    log.info(f"{uid} refused {self.id} offer (predicted pickup time too long)")
-                    user.set_state_stop()
-                    user.notify(self._tcurrent)
-                    refuse_user.append(user)
+            # The vehicles do not move during the matching
+            if self.fleet is not None:
+                self.fleet.keep_position_index()
+
+            try:
+                if self._batch_matching:
+                    batch_service_dt = self.batch_request(list(self._user_buffer.values()))
+
+                for uid, (user, drop_node) in self._user_buffer.items():
+                    if self._batch_matching:
+                        service_dt = batch_service_dt[uid]
+                        # The user has not been assigned a vehicle
+                        matched = uid in self._cache_request_vehicles
+                    else:
+                        service_dt = self.request(user, drop_node)
+                        matched = True
+                    if matched and user.pickup_dt[self.id] > service_dt:
+                        self.matching(user, drop_node)
+                    else:
+                        log.info(f"{uid} refused {self.id} offer (predicted pickup time too long)")
+                        user.set_state_stop()
+                        user.notify(self._tcurrent)
+                        refuse_user.append(user)
+                    if not self._batch_matching:
+                        self._cache_request_vehicles = dict()
+
+                # NB: we clean _user_buffer here because answer provided by the mobility
+                #     service should be YES I match with you or No I refuse you, but not
+                #     let's wait the next timestep to see if I can find a vehicle for you
+                #     Mob service has only one chance to propose a match to the user,
+                #     except if user request the service again
+                self._user_buffer = dict()
+            finally:
+                # The cached vehicles, paths and positions are only valid during this matching round, even if
+                # it is interrupted by an exception
                 self._cache_request_vehicles = dict()
-
-            self._user_buffer = dict()
-            # NB: we clean _user_buffer here because answer provided by the mobility
-            #     service should be YES I match with you or No I refuse you, but not
-            #     let's wait the next timestep to see if I can find a vehicle for you
-            #     Mob service has only one chance to propose a match to the user,
-            #     except if user request the service again
+                self._pickup_trees = dict()
+                self._pickup_nodes = None
+                if self.fleet is not None:
+                    self.fleet.clear_position_index()
         else:
             self._counter_matching += 1
 
         return refuse_user
 
+    def invalidate_path_cache(self, updated_links: Optional[Set[str]] = None):
+        """
+        Called when the costs of the graph are updated, services caching shortest paths must drop them
+
+        Args:
+            updated_links: The links whose costs changed, None if they are unknown
+
+        Returns:
+            None
+        """
+        pass
+
     def periodic_maintenance(self, dt: Dt):
         """
         This method is called every n step to perform maintenance
@@ -164,8 +247,10 @@ class AbstractOnDemandMobilityService(AbstractMobilityService, metaclass=ABCMeta
                  dt_matching: int,
                  dt_rebalancing: int,
                  veh_capacity: int,
-                 horizon: AbstractDemandHorizon):
-        super(AbstractOnDemandMobilityService, self).__init__(_id, veh_capacity, dt_matching, dt_rebalancing)
+                 horizon: AbstractDemandHorizon,
+                 pickup_tree: bool = False):
+        super(AbstractOnDemandMobilityService, self).__init__(_id, veh_capacity, dt_matching, dt_rebalancing,
+                                                              pickup_tree)
         self._horizon: AbstractDemandHorizon = horizon
 
     @abstractmethod
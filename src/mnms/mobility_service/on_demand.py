@@ -1,4 +1,4 @@
-from typing import Tuple, Dict
+from typing import Tuple, Dict, List, Optional, Set
 
 import numpy as np
 
@@ -6,8 +6,10 @@ from hipop.shortest_path import dijkstra
 
 from mnms import create_logger
 from mnms.demand import User
+from mnms.graph.shortest_path import ReverseShortestPathTree
 from mnms.mobility_service.abstract import AbstractMobilityService
 from mnms.time import Dt
+from mnms.tools.assignment import linear_sum_assignment
 from mnms.tools.exceptions import PathNotFound
 from mnms.vehicles.veh_type import VehicleState, VehicleActivityServing, VehicleActivityStop, \
     VehicleActivityPickup, VehicleActivityRepositioning
@@ -15,12 +17,58 @@ from mnms.vehicles.veh_type import VehicleState, VehicleActivityServing, Vehicle
 log = create_logger(__name__)
 
 
+def batch_request_empty_vehicles(service: AbstractMobilityService, users: List[Tuple[User, str]]) -> Dict[str, Dt]:
+    """
+    Batch request of the on-demand services, the empty vehicles are assigned to the users so that the total
+    pickup travel time is minimal. The travel time of the assigned vehicle is also the predicted pickup dt
+
+    Args:
+        service: The on-demand service
+        users: The users and their drop nodes
+
+    Returns:
+        The predicted pickup dt of each user, 24 hours if no vehicle is assigned
+    """
+    service_dt = {user.id: Dt(hours=24) for user, _ in users}
+
+    vehicles = [veh for veh in service.fleet.vehicles.values() if veh.is_empty]
+    veh_nodes = [veh.activity.node if not veh.activities else veh.activities[-1].node for veh in vehicles]
+    trees = [service.get_pickup_tree(user) for user, _ in users]
+    costs = np.array([[tree.cost(node) for node in veh_nodes] for tree in trees]).reshape(len(trees),
+                                                                                          len(veh_nodes))
+
+    # Only keep the users and vehicles that can be matched with each other
+    finite = np.isfinite(costs)
+    user_indices = np.flatnonzero(finite.any(axis=1))
+    veh_indices = np.flatnonzero(finite.any(axis=0))
+    costs = costs[np.ix_(user_indices, veh_indices)]
+    finite = finite[np.ix_(user_indices, veh_indices)]
+    if not finite.any():
+        return service_dt
+
+    # Forbidden pairs are given a cost higher than any assignment of allowed pairs
+    forbidden_cost = costs[finite].max() * min(costs.shape) + 1
+    for row, col in zip(*linear_sum_assignment(np.where(finite, costs, forbidden_cost))):
+        if finite[row, col]:
+            user = users[user_indices[row]][0]
+            veh = vehicles[veh_indices[col]]
+            veh_path = trees[user_indices[row]].path(veh_nodes[veh_indices[col]])
+            service_dt[user.id] = Dt(seconds=costs[row, col])
+            service._cache_request_vehicles[user.id] = veh, veh_path
+
+    return service_dt
+
+
 class OnDemandMobilityService(AbstractMobilityService):
+    supports_batch_matching = True
+
     def __init__(self,
                  _id: str,
                  dt_matching: int,
-                 dt_step_maintenance: int = 0):
-        super(OnDemandMobilityService, self).__init__(_id, 1, dt_matching, dt_step_maintenance)
+                 dt_step_maintenance: int = 0,
+                 pickup_tree: bool = False,
+                 batch_matching: bool = False):
+        super(OnDemandMobilityService, self).__init__(_id, 1, dt_matching, dt_step_maintenance, pickup_tree, batch_matching)
 
         self.gnodes = dict()
 
@@ -40,41 +88,49 @@ class OnDemandMobilityService(AbstractMobilityService):
     def request(self, user: User, drop_node: str) -> Dt:
         upos = user.position
         uid = user.id
-        vehs = list(self.fleet.vehicles.keys())
 
         service_dt = Dt(hours=24)
 
-        while vehs:
-            veh_pos = np.array([self.fleet.vehicles[v].position for v in vehs])
-            dist_vector = np.linalg.norm(veh_pos - upos, axis=1)
-            nearest_veh_index = np.argmin(dist_vector)
-            nearest_veh = vehs[nearest_veh_index]
-
-            vehs.remove(nearest_veh)
-            choosen_veh = self.fleet.vehicles[nearest_veh]
-            if not choosen_veh.is_full:
-                if choosen_veh.is_empty:
-                    veh_last_node = choosen_veh.activity.node if not choosen_veh.activities else \
-                    choosen_veh.activities[-1].node
-                    veh_path, cost = dijkstra(self.graph, veh_last_node, user.current_node, 'travel_time', {self.layer.id: self.id}, {self.layer.id})
-                    if cost == float('inf'):
-                        raise PathNotFound(choosen_veh._current_node, user.current_node)
+        # Only the empty vehicles can be chosen, they are explored by increasing distance
+        for choosen_veh in self.fleet.nearest_vehicles(upos, "empty"):
+            veh_last_node = choosen_veh.activity.node if not choosen_veh.activities else \
+            choosen_veh.activities[-1].node
+            if self._pickup_tree:
+                pickup_tree = self.get_pickup_tree(user)
+                veh_path, cost = pickup_tree.path(veh_last_node), pickup_tree.cost(veh_last_node)
+            else:
+                veh_path, cost = dijkstra(self.graph, veh_last_node, user.current_node, 'travel_time', {self.layer.id: self.id}, {self.layer.id})
+            if cost == float('inf'):
+                raise PathNotFound(choosen_veh._current_node, user.current_node)
+
+            len_path = 0
+            for i in range(len(veh_path) - 1):
+                j = i + 1
+                len_path += self.gnodes[veh_path[i]].adj[veh_path[j]].length
+
+            service_dt = Dt(seconds=len_path / choosen_veh.speed)
+            self._cache_request_vehicles[uid] = choosen_veh, veh_path
+            break
 
-                    len_path = 0
-                    for i in range(len(veh_path) - 1):
-                        j = i + 1
-                        len_path += self.gnodes[veh_path[i]].adj[veh_path[j]].length
+        return service_dt
 
-                    service_dt = Dt(seconds=len_path / choosen_veh.speed)
-                    self._cache_request_vehicles[uid] = choosen_veh, veh_path
-                    break
+    def batch_request(self, users: List[Tuple[User, str]]) -> Dict[str, Dt]:
+        """
+        Make an offer to all the buffered users at once when `batch_matching` is set, the chosen vehicle of each
+        user is cached for `matching` and the users without a cached vehicle are refused
 
-        return service_dt
+        Args:
+            users: The users and their drop nodes
+
+        Returns:
+            The predicted pickup dt of each user
+        """
+        return batch_request_empty_vehicles(self, users)
 
     def matching(self, user: User, drop_node: str):
         veh, veh_path = self._cache_request_vehicles[user.id]
         upath = list(user.path.nodes)
-        upath = upath[upath.index(user._current_node):upath.index(drop_node) + 1]
+        upath = upath[user.path.node_index(user._current_node):user.path.node_index(drop_node) + 1]
         user_path = self.construct_veh_path(upath)
         veh_path = self.construct_veh_path(veh_path)
         activities = [
@@ -105,14 +161,24 @@ class OnDemandMobilityService(AbstractMobilityService):
 
 
 class OnDemandDepotMobilityService(AbstractMobilityService):
+    supports_batch_matching = True
+
     def __init__(self,
                  _id: str,
                  dt_matching: int,
-                 dt_step_maintenance: int = 0):
-        super(OnDemandDepotMobilityService, self).__init__(_id, 1, dt_matching, dt_step_maintenance)
+                 dt_step_maintenance: int = 0,
+                 pickup_tree: bool = False,
+                 batch_matching: bool = False,
+                 depot_tree: bool = False):
+        super(OnDemandDepotMobilityService, self).__init__(_id, 1, dt_matching, dt_step_maintenance, pickup_tree, batch_matching)
         self.gnodes = None
         self.depot = dict()
 
+        # If True, the idle vehicles go to the depot nearest in travel time, read from one reverse search from all
+        # the depots that are not full
+        self._depot_tree: bool = depot_tree
+        self._available_depots_tree: Optional[ReverseShortestPathTree] = None
+
     def _create_waiting_vehicle(self, node: str):
         assert node in self.graph.nodes
         new_veh = self.fleet.create_vehicle(node,
@@ -136,6 +202,27 @@ class OnDemandDepotMobilityService(AbstractMobilityService):
     def is_depot_full(self, node: str):
         return self.depot[node]["capacity"] == len(self.depot[node]["vehicles"])
 
+    def get_available_depots_tree(self) -> ReverseShortestPathTree:
+        """
+        Get the reverse shortest path tree from all the depots that are not full, it is kept until the depots
+        that are not full or the costs of the graph change
+
+        Returns:
+            The tree
+        """
+        available_depots = [d for d in self.depot if not self.is_depot_full(d)]
+        if self._available_depots_tree is None or self._available_depots_tree.target != available_depots:
+            self._available_depots_tree = ReverseShortestPathTree(self.graph,
+                                                                  available_depots,
+                                                                  'travel_time',
+                                                                  self.layer.id,
+                                                                  self.id,
+                                                                  nodes=self.gnodes)
+        return self._available_depots_tree
+
+    def invalidate_path_cache(self, updated_links: Optional[Set[str]] = None):
+        self._available_depots_tree = None
+
     def step_maintenance(self, dt: Dt):
         self.gnodes = self.graph.nodes
 
@@ -144,7 +231,18 @@ class OnDemandDepotMobilityService(AbstractMobilityService):
 
         for veh in self.fleet.vehicles.values():
             if veh.state is VehicleState.STOP:
-                if veh._current_node not in self.depot:
+                if veh._current_node not in self.depot and self._depot_tree:
+                    available_depots_tree = self.get_available_depots_tree()
+                    nearest_depot = available_depots_tree.root(veh._current_node)
+                    if nearest_depot is None:
+                        raise PathNotFound(veh._current_node, depot)
+
+                    veh_path = self.construct_veh_path(available_depots_tree.path(veh._current_node))
+                    repositioning = VehicleActivityRepositioning(node=nearest_depot,
+                                                                 path=veh_path)
+                    veh.activity.is_done = True
+                    veh.add_activities([repositioning])
+                elif veh._current_node not in self.depot:
                     veh_position = veh.position
                     dist_vector = np.linalg.norm(depot_pos - veh_position, axis=1)
                     sorted_ind = np.argsort(dist_vector)
@@ -178,45 +276,42 @@ class OnDemandDepotMobilityService(AbstractMobilityService):
         service_dt = Dt(hours=24)
         upos = user.position
 
-        vehs = list(self.fleet.vehicles.keys())
-
-        while vehs:
-            veh_pos = np.array([self.fleet.vehicles[v].position for v in vehs])
-            dist_vector = np.linalg.norm(veh_pos - upos, axis=1)
-            nearest_veh_index = np.argmin(dist_vector)
-            nearest_veh = vehs[nearest_veh_index]
-
-            vehs.remove(nearest_veh)
-            choosen_veh = self.fleet.vehicles[nearest_veh]
-            if not choosen_veh.is_full:
-                if choosen_veh.is_empty:
-                    veh_last_node = choosen_veh.activity.node if not choosen_veh.activities else \
-                    choosen_veh.activities[-1].node
-                    veh_path, cost = dijkstra(self.graph,
-                                              veh_last_node,
-                                              user.current_node,
-                                              'travel_time',
-                                              {self.layer.id: self.id,
-                                               "TRANSIT": "WALK"},
-                                              {self.layer.id})
-                    if cost == float('inf'):
-                        continue
-
-                    len_path = 0
-                    for i in range(len(veh_path) - 1):
-                        j = i + 1
-                        len_path += self.gnodes[veh_path[i]].adj[veh_path[j]].length
-
-                    service_dt = Dt(seconds=len_path / choosen_veh.speed)
-                    self._cache_request_vehicles[user.id] = choosen_veh, veh_path
-                    break
+        # Only the empty vehicles can be chosen, they are explored by increasing distance
+        for choosen_veh in self.fleet.nearest_vehicles(upos, "empty"):
+            veh_last_node = choosen_veh.activity.node if not choosen_veh.activities else \
+            choosen_veh.activities[-1].node
+            if self._pickup_tree:
+                pickup_tree = self.get_pickup_tree(user)
+                veh_path, cost = pickup_tree.path(veh_last_node), pickup_tree.cost(veh_last_node)
+            else:
+                veh_path, cost = dijkstra(self.graph,
+                                          veh_last_node,
+                                          user.current_node,
+                                          'travel_time',
+                                          {self.layer.id: self.id,
+                                           "TRANSIT": "WALK"},
+                                          {self.layer.id})
+            if cost == float('inf'):
+                continue
+
+            len_path = 0
+            for i in range(len(veh_path) - 1):
+                j = i + 1
+                len_path += self.gnodes[veh_path[i]].adj[veh_path[j]].length
+
+            service_dt = Dt(seconds=len_path / choosen_veh.speed)
+            self._cache_request_vehicles[user.id] = choosen_veh, veh_path
+            break
 
         return service_dt
 
+    def batch_request(self, users: List[Tuple[User, str]]) -> Dict[str, Dt]:
+        return batch_request_empty_vehicles(self, users)
+
     def matching(self, user: User, drop_node: str):
         veh, veh_path = self._cache_request_vehicles[user.id]
         upath = list(user.path.nodes)
-        upath = upath[upath.index(user._current_node):upath.index(drop_node) + 1]
+        upath = upath[user.path.node_index(user._current_node):user.path.node_index(drop_node) + 1]
 
         user_path = self.construct_veh_path(upath)
         veh_path = self.construct_veh_path(veh_path)
@@ -1,9 +1,9 @@
 from collections import deque
 from dataclasses import dataclass, field
 from typing import List, Dict, Tuple, Optional, Deque
-from queue import PriorityQueue
 
 import numpy as np
+from hipop.graph import Node
 from hipop.shortest_path import dijkstra, compute_path_length
 
 from mnms import create_logger
@@ -76,12 +76,16 @@ class ParkingService(AbstractOnDemandMobilityService):
                  dt_rebalancing: int,
                  veh_capacity: int,
                  horizon: AbstractDemandHorizon,
-                 vehicle_filter: FilterProtocol = None):
-        super(ParkingService, self).__init__(_id, veh_capacity, dt_matching, dt_rebalancing, horizon)
+                 vehicle_filter: FilterProtocol = None,
+                 pickup_tree: bool = False,
+                 max_candidates: Optional[int] = None):
+        super(ParkingService, self).__init__(_id, veh_capacity, dt_matching, dt_rebalancing, horizon, pickup_tree)
 
         self._vehicle_filter = IsWaiting() & InRadiusFilter(100) if vehicle_filter is None else vehicle_filter
         self._replanning_strategy = None
         self.include_all_user_disutility = False
+        # Maximum number of vehicles evaluated for a request, by increasing lower bound of their disutility
+        self._max_candidates: Optional[int] = max_candidates
 
         self.depots: Dict[str, Depot] = dict()
 
@@ -113,6 +117,17 @@ class ParkingService(AbstractOnDemandMobilityService):
     def rebalancing(self, next_demand: List[User], horizon: Dt):
         pass
 
+    def _compute_pickup_path(self, node: str, user: User) -> Tuple[List[str], float]:
+        if self._pickup_tree:
+            pickup_tree = self.get_pickup_tree(user)
+            return pickup_tree.path(node), pickup_tree.cost(node)
+        return dijkstra(self.graph,
+                        node,
+                        user.current_node,
+                        'travel_time',
+                        {self.layer.id: self.id},
+                        {self.layer.id})
+
     def replanning(self, veh: Vehicle, new_activities: List[VehicleActivity]) -> Tuple[List[VehicleActivity], Dt]:
         new_plan = [veh.activity.copy()] + [activity.copy() for activity in veh.activities]
         pickup_activity = new_activities[0]
@@ -121,12 +136,7 @@ class ParkingService(AbstractOnDemandMobilityService):
 
         if veh.state is not VehicleState.STOP:
             veh_next_node = veh.current_link[1]
-            pickup_path, cost_pickup = dijkstra(self.graph,
-                                                veh_next_node,
-                                                user.current_node,
-                                                'travel_time',
-                                                {self.layer.id: self.id},
-                                                {self.layer.id})
+            pickup_path, cost_pickup = self._compute_pickup_path(veh_next_node, user)
 
             if cost_pickup == float('inf'):
                 raise PathNotFound(veh_next_node, user.current_node)
@@ -170,12 +180,7 @@ class ParkingService(AbstractOnDemandMobilityService):
             new_plan.append(serving_activity)
 
         else:
-            pickup_path, cost_pickup = dijkstra(self.graph,
-                                                veh._current_node,
-                                                user.current_node,
-                                                'travel_time',
-                                                {self.layer.id: self.id},
-                                                {self.layer.id})
+            pickup_path, cost_pickup = self._compute_pickup_path(veh._current_node, user)
 
             if cost_pickup == float('inf'):
                 raise PathNotFound(veh._current_node, user.current_node)
@@ -223,31 +228,100 @@ class ParkingService(AbstractOnDemandMobilityService):
         all_vehicles = np.array(list(self.fleet.vehicles.values()))
         uid = user.id
         mask = self._vehicle_filter.get_mask(self.layer, all_vehicles, user.position, list(self.depots.values()))
-        vehicles = all_vehicles[mask]
-        candidate_vehicles = PriorityQueue()
-        veh_pickup = dict()
-        veh_new_plan = dict()
-        for veh in vehicles:
-            if pre_compute_feasibility(veh):
-                activities = [VehicleActivityPickup(node=user.current_node,
-                                                    user=user),
-                              VehicleActivityServing(node=drop_node,
-                                                     user=user)]
-                new_plan, pickup_dt = self.replanning(veh, activities)
-                veh_pickup[veh.id] = pickup_dt
-                veh_new_plan[veh.id] = new_plan
-                disutility = self.quality_disutility(veh, new_plan, user if self.include_all_user_disutility else None)
-
-                if disutility != float("inf"):
-                    candidate_vehicles.put((disutility, veh))
-
-        if not candidate_vehicles.empty():
-            _, veh = candidate_vehicles.get()
-            service_dt = veh_pickup[veh.id]
-            self._cache_request_vehicles[uid] = veh, veh_new_plan[veh.id]
+        vehicles = [veh for veh in all_vehicles[mask] if pre_compute_feasibility(veh)]
+
+        # The vehicles are evaluated by increasing lower bound of their disutility, until the best disutility found
+        # is lower than the bound of the next vehicle. Ties are won by the vehicle coming first in the filtered
+        # vehicles, as if all of them were evaluated in this order
+        if len(vehicles) > 1:
+            nodes = self.graph.nodes
+            lower_bounds = [self.get_disutility_lower_bound(veh, user, nodes) for veh in vehicles]
+            order = np.argsort(lower_bounds, kind='stable')
+        else:
+            lower_bounds = [-float('inf')] * len(vehicles)
+            order = range(len(vehicles))
+
+        best = (float("inf"), -1)
+        best_veh = None
+        nb_evaluated = 0
+        for i in order:
+            veh = vehicles[i]
+            if best < (lower_bounds[i], i):
+                break
+            if self._max_candidates is not None and nb_evaluated >= self._max_candidates:
+                break
+
+            new_plan, pickup_dt, disutility = self.evaluate_candidate(veh, user, drop_node)
+            nb_evaluated += 1
+            if (disutility, i) < best:
+                best = (disutility, i)
+                best_veh = veh, new_plan, pickup_dt
+
+        if best_veh is not None:
+            veh, new_plan, service_dt = best_veh
+            self._cache_request_vehicles[uid] = veh, new_plan
 
         return service_dt
 
+    def evaluate_candidate(self, veh: Vehicle, user: User, drop_node: str) -> Tuple[List[VehicleActivity], Dt, float]:
+        """
+        Compute the new plan of a vehicle picking up a user and its disutility
+
+        Args:
+            veh: The candidate vehicle
+            user: The user to pick up
+            drop_node: The node where the user is dropped
+
+        Returns:
+            The new plan, the pickup dt and the disutility
+        """
+        activities = [VehicleActivityPickup(node=user.current_node,
+                                            user=user),
+                      VehicleActivityServing(node=drop_node,
+                                             user=user)]
+        new_plan, pickup_dt = self.replanning(veh, activities)
+        disutility = self.quality_disutility(veh, new_plan, user if self.include_all_user_disutility else None)
+        return new_plan, pickup_dt, disutility
+
+    def get_disutility_lower_bound(self, vehicle: Vehicle, user: User, nodes: Dict[str, Node]) -> float:
+        """
+        Lower bound of the disutility of the plan where a vehicle picks up a new user, computed without any
+        shortest path. The replanned path of a moving vehicle goes through the user, each passenger still has to
+        travel at least the straight-line distance from the vehicle to the user and from the user to its drop
+        node. A stopped vehicle keeps the paths of its activities, which start from its node after the pickup,
+        the remaining distance of its passengers cannot be shorter than the current one
+
+        Args:
+            vehicle: The vehicle
+            user: The new user
+            nodes: The nodes of the graph
+
+        Returns:
+            The lower bound
+        """
+        if self.include_all_user_disutility:
+            return -float("inf")
+
+        current_plan = [vehicle.activity] + list(vehicle.activities)
+        user_position = np.array(nodes[user.current_node].position)
+        pickup_distance = np.linalg.norm(user_position - vehicle.position)
+
+        lower_bound = 0
+        for passenger in vehicle.passenger.values():
+            distance_value = passenger.parameters["distance_value"]
+            if distance_value < 0:
+                return -float("inf")
+            if vehicle.state is VehicleState.STOP:
+                lower_bound -= get_discount()
+                continue
+            current_plan_truncated = truncate_plan(passenger, current_plan)
+            drop_position = nodes[current_plan_truncated[-1].node].position
+            new_remaining_distance = pickup_distance + np.linalg.norm(user_position - drop_position)
+            current_remaining_distance = get_remaining_distance(vehicle, current_plan_truncated)
+            lower_bound += distance_value * (new_remaining_distance - current_remaining_distance) - get_discount()
+
+        return lower_bound
+
     def step_maintenance(self, dt: Dt):
         for uid in self.users:
             self.users[uid].update_distance()
@@ -15,7 +15,7 @@ class PersonalMobilityService(AbstractMobilityService):
 
     def matching(self, user: User, drop_node: str):
         upath = list(user.path.nodes)
-        upath = upath[upath.index(user._current_node):upath.index(drop_node) + 1]
+        upath = upath[user.path.node_index(user._current_node):user.path.node_index(drop_node) + 1]
         veh_path = self.construct_veh_path(upath)
         new_veh = self.fleet.create_vehicle(upath[0],
                                             capacity=self._veh_capacity,
@@ -3,6 +3,8 @@ from collections import defaultdict, deque
 from functools import cached_property
 from typing import List, Dict, Tuple, Optional, Deque, Generator, Type, Union
 
+import numpy as np
+
 from mnms.demand import User
 from mnms.log import create_logger
 from mnms.mobility_service.abstract import AbstractMobilityService
@@ -132,6 +134,10 @@ class PublicTransportMobilityService(AbstractMobilityService):
         self._current_time_table: Dict[str, Time] = dict()
         self._next_time_table: Dict[str, Time] = dict()
         self._next_veh_departure: Dict[str, Optional[Tuple[Time, Vehicle]]] = defaultdict(lambda: None)
+        # Line and position in the line of each stop, and distance from the first stop of a line to each of its
+        # stops, filled when the layer is initialized
+        self._stop_lines: Dict[str, Tuple[str, int]] = dict()
+        self._line_cumulative_lengths: Dict[str, np.ndarray] = dict()
 
         self.gnodes = None
 
@@ -218,8 +224,8 @@ class PublicTransportMobilityService(AbstractMobilityService):
         log.info(f"Add passenger {user} -> {veh}")
         user.set_state_waiting_vehicle()
 
-        pu_node_ind = line_nodes.index(user._current_node)
-        do_node_ind = line_nodes.index(drop_node)
+        pu_node_ind = self._stop_lines[user._current_node][1]
+        do_node_ind = self._stop_lines[drop_node][1]
 
         assert pu_node_ind < do_node_ind, f'Pickup index {pu_node_ind} should necessarily take place '\
             f'before dropoff index {do_node_ind} on the public transport line for User {user.id}.'
@@ -235,7 +241,7 @@ class PublicTransportMobilityService(AbstractMobilityService):
         ind_pu = -1
         for ind, activity in enumerate(activities_including_curr):
             activity_node = activity.node
-            activity_node_ind = line_nodes.index(activity_node)
+            activity_node_ind = self._stop_lines[activity_node][1]
             if pu_node_ind <= activity_node_ind and ind_pu == -1:
                 ind_pu = ind
             if do_node_ind <= activity_node_ind:
@@ -253,14 +259,11 @@ class PublicTransportMobilityService(AbstractMobilityService):
         veh_remaining_length = veh.remaining_link_length
         veh_traveled_dist_link = veh_link_length - veh_remaining_length
 
-        line_stops = line["nodes"]
-        ind_user = line_stops.index(user_node)
-        ind_veh = line_stops.index(veh_node)
+        lid, ind_user = self._stop_lines[user_node]
+        ind_veh = self._stop_lines[veh_node][1]
 
-        path = line_stops[ind_veh:ind_user+1]
-        dist = 0
-        for i in range(len(path)-1):
-            dist += self.gnodes[path[i]].adj[path[i+1]].length
+        cumulative_lengths = self._line_cumulative_lengths[lid]
+        dist = cumulative_lengths[ind_user] - cumulative_lengths[ind_veh] if ind_veh < ind_user else 0
         dist -= veh_traveled_dist_link
         # NB: if veh has not been moved yet (stopped at the first station of the
         #     line, speed of veh corresponds to the initial speed, it may be different
@@ -279,11 +282,9 @@ class PublicTransportMobilityService(AbstractMobilityService):
         chosen_line = None
 
         # Select the proper line for user
-        for lid, line in self.lines.items():
-            if start in line['nodes']:
-                chosen_line = line
-                user_line_id = lid
-                break
+        if start in self._stop_lines:
+            user_line_id, ind_start = self._stop_lines[start]
+            chosen_line = self.lines[user_line_id]
         else:
             log.error(f'{user} start is not in the PublicTransport mobility service {self.id}')
             sys.exit(-1)
@@ -292,9 +293,8 @@ class PublicTransportMobilityService(AbstractMobilityService):
             departure_time, waiting_veh = self._next_veh_departure[user_line_id]
             chosen_veh = waiting_veh
         else:
-            ind_start = chosen_line["nodes"].index(start)
             for veh in reversed(list(self.vehicles[user_line_id])):
-                ind_curr_veh = chosen_line["nodes"].index(veh.current_link[1])
+                ind_curr_veh = self._stop_lines[veh.current_link[1]][1]
                 if ind_curr_veh <= ind_start:
                     chosen_veh = veh
                     break
@@ -113,6 +113,7 @@ class Supervisor(object):
         self._user_flow.set_time(tstart)
 
         self._mlgraph.dynamic_space_sharing.cost = self._decision_model._cost
+        self._mlgraph.dynamic_space_sharing.decision_model = self._decision_model
 
     def update_mobility_services(self, flow_dt:Dt):
         for layer in self._mlgraph.layers.values():
@@ -142,7 +143,7 @@ class Supervisor(object):
         all_refused_user = user_reach_dt_pickup + user_reach_dt_answer
         self._decision_model.set_refused_users(all_refused_user)
         for u in all_refused_user:
-            self._user_flow.users.pop(u.id, None)
+            self._user_flow.remove_user(u.id)
             self._user_flow._waiting_answer.pop(u.id, None)
         end = time()
         log.info(f' Done [{end - start:.5} s]')
@@ -250,6 +251,10 @@ class Supervisor(object):
             log.info(' Updating graph ...')
             start = time()
             self._flow_motor.update_graph()
+            self._decision_model.invalidate_path_cache(self._flow_motor.updated_links)
+            for layer in self._mlgraph.layers.values():
+                for mservice in layer.mobility_services.values():
+                    mservice.invalidate_path_cache(self._flow_motor.updated_links)
             end = time()
             log.info(f' Done [{end-start:.5} s]')
 
@@ -10,7 +10,28 @@ from mnms.log import create_logger
 log = create_logger(__name__)
 
 
+# Time and Dt are stored as an integer number of ticks, Decimal and float are only used at the edges
+TICKS_PER_SECOND = 1000000
+TICKS_PER_MINUTE = 60 * TICKS_PER_SECOND
+TICKS_PER_HOUR = 60 * TICKS_PER_MINUTE
+
+
+def seconds_to_ticks(seconds) -> int:
+    """
+    Convert seconds to ticks
+
+    Args:
+        seconds: The seconds, either an int, a float or a Decimal
+
+    Returns:
+        The number of ticks
+    """
+    return int(round(seconds * TICKS_PER_SECOND))
+
+
 class Dt(object):
+    __slots__ = ('_ticks',)
+
     def __init__(self,
                  hours: int = 0,
                  minutes: int = 0,
@@ -28,71 +49,78 @@ class Dt(object):
         assert minutes >= 0
         assert seconds >= 0
 
-        new_seconds = Decimal(seconds)%60
-        new_minutes = minutes + seconds//60
-        hours = hours + new_minutes//60
-        minutes = new_minutes%60
-        seconds = new_seconds%60
+        # Seconds are converted separately as they may be a Decimal, which cannot be added to float hours or minutes
+        self._ticks: int = seconds_to_ticks(hours * 3600 + minutes * 60) + seconds_to_ticks(seconds)
+
+    @classmethod
+    def from_ticks(cls, ticks: int) -> "Dt":
+        """
+        Build a Dt instance from a number of ticks
+
+        Args:
+            ticks: The number of ticks
+
+        Returns:
+            Dt instance
+        """
+        assert ticks >= 0, f"{ticks}"
+        dt = cls.__new__(cls)
+        dt._ticks = ticks
+        return dt
+
+    @property
+    def ticks(self) -> int:
+        return self._ticks
+
+    @property
+    def _hours(self):
+        return self._ticks // TICKS_PER_HOUR
+
+    @property
+    def _minutes(self):
+        return self._ticks % TICKS_PER_HOUR // TICKS_PER_MINUTE
 
-        self._hours = hours
-        self._minutes = minutes
-        self._seconds = Decimal(seconds)
+    @property
+    def _seconds(self):
+        return Decimal(self._ticks % TICKS_PER_MINUTE) / TICKS_PER_SECOND
 
     def __mul__(self, other:int):
-        seconds = self._seconds*other
-        minutes = int(self._minutes*other)
-        hours = int(self._hours*other)
-        return Dt(hours, minutes, seconds)
+        return Dt.from_ticks(int(round(self._ticks * other)))
 
     def __add__(self, other):
-        seconds = self._seconds+other._seconds
-        minutes = int(self._minutes+other._minutes)
-        hours = int(self._hours+other._hours)
-        return Dt(hours, minutes, seconds)
+        return Dt.from_ticks(self._ticks + other._ticks)
 
     def __sub__(self, other):
-        seconds = self._seconds-other._seconds
-        minutes = int(self._minutes-int(other._minutes))
-        hours = int(self._hours-int(other._hours))
-        if seconds < 0:
-            seconds = 60 + seconds
-            minutes -= 1
-        if minutes < 0:
-            minutes = 60 + seconds
-            hours -= 1
-
-        return Dt(hours, minutes, seconds)
+        return Dt.from_ticks(self._ticks - other._ticks)
 
     def __repr__(self):
         return f"dt(hours:{self._hours}, minutes:{self._minutes}, seconds:{self._seconds})"
 
     def __eq__(self, other):
-        return self.to_seconds() == other.to_seconds()
+        return self._ticks == other._ticks
 
     def __lt__(self, other):
-        return self.to_seconds() < other.to_seconds()
+        return self._ticks < other._ticks
 
     def __le__(self, other):
-        return self.to_seconds() <= other.to_seconds()
+        return self._ticks <= other._ticks
 
     def __gt__(self, other):
-        return self.to_seconds() > other.to_seconds()
+        return self._ticks > other._ticks
 
     def __ge__(self, other):
-        return self.to_seconds() >= other.to_seconds()
+        return self._ticks >= other._ticks
 
     def to_seconds(self):
-        return float(int(self._hours * 3600) + int(self._minutes * 60) + self._seconds)
+        return self._ticks / TICKS_PER_SECOND
 
     def copy(self):
-        copy = Dt()
-        copy._hours = self._hours
-        copy._minutes = self._minutes
-        copy._seconds = self._seconds
-        return copy
+        return Dt.from_ticks(self._ticks)
 
 
 class Time(object):
+    __slots__ = ('_ticks',)
+
     def __init__(self, strdate: str = "00:00:00"):
         """
         Class representing time in mnms
@@ -100,18 +128,16 @@ class Time(object):
         Args:
             strdate: A string representing a time with the format HH:MM:SS
         """
-        self._hours = None
-        self._minutes = None
-        self._seconds = None
+        self._ticks: int = 0
 
         if strdate != "":
             self._str_to_floats(strdate)
 
     def _str_to_floats(self, date):
         split_string = date.split(':')
-        self._hours = Decimal(split_string[0])
-        self._minutes = Decimal(split_string[1])
-        self._seconds = Decimal(split_string[2])
+        self._ticks = int(split_string[0]) * TICKS_PER_HOUR \
+                      + int(split_string[1]) * TICKS_PER_MINUTE \
+                      + seconds_to_ticks(Decimal(split_string[2]))
 
     def to_seconds(self) -> float:
         """
@@ -121,7 +147,7 @@ class Time(object):
             Seconds
 
         """
-        return float(self._hours*3600+self._minutes*60+self._seconds)
+        return self._ticks / TICKS_PER_SECOND
 
     @classmethod
     def from_seconds(cls, seconds: float) -> "Time":
@@ -134,13 +160,21 @@ class Time(object):
             Time instance
 
         """
-        time = cls('')
-        m, s = divmod(seconds, 60)
-        h, m = divmod(m, 60)
-        time._seconds = s
-        time._minutes = int(m)
-        time._hours = int(h)
+        return cls.from_ticks(seconds_to_ticks(seconds))
+
+    @classmethod
+    def from_ticks(cls, ticks: int) -> "Time":
+        """
+        Build a Time instance from a number of ticks
 
+        Args:
+            ticks: The number of ticks since midnight
+
+        Returns:
+            Time instance
+        """
+        time = cls.__new__(cls)
+        time._ticks = ticks
         return time
 
     @classmethod
@@ -153,12 +187,7 @@ class Time(object):
         Returns:
             Time instance
         """
-        time = cls('')
-        time._seconds = dt._seconds
-        time._minutes = dt._minutes
-        time._hours = dt._hours
-
-        return time
+        return cls.from_ticks(dt._ticks)
 
     def __repr__(self):
         return f"Time({self.time})"
@@ -167,101 +196,84 @@ class Time(object):
         return self.time
 
     def __eq__(self, other):
-        return self.to_seconds() == other.to_seconds()
+        return self._ticks == other._ticks
 
     def __lt__(self, other):
-        return self.to_seconds() < other.to_seconds()
+        return self._ticks < other._ticks
 
     def __le__(self, other):
-        return self.to_seconds() <= other.to_seconds()
+        return self._ticks <= other._ticks
 
     def __gt__(self, other):
-        return self.to_seconds() > other.to_seconds()
+        return self._ticks > other._ticks
 
     def __ge__(self, other):
-        return self.to_seconds() >= other.to_seconds()
+        return self._ticks >= other._ticks
 
     def __sub__(self, other):
-        return Dt(seconds=self.to_seconds()-other.to_seconds())
+        return Dt.from_ticks(self._ticks - other._ticks)
+
+    @property
+    def ticks(self) -> int:
+        return self._ticks
+
+    @property
+    def _hours(self):
+        return self._ticks // TICKS_PER_HOUR
+
+    @property
+    def _minutes(self):
+        return self._ticks % TICKS_PER_HOUR // TICKS_PER_MINUTE
+
+    @property
+    def _seconds(self):
+        return Decimal(self._ticks % TICKS_PER_MINUTE) / TICKS_PER_SECOND
 
     @property
     def seconds(self):
-        return float(self._seconds)
+        return self._ticks % TICKS_PER_MINUTE / TICKS_PER_SECOND
 
     @seconds.setter
     def seconds(self, value):
         assert value < 60
-        self._seconds = Decimal(value)
+        self._ticks += seconds_to_ticks(value) - self._ticks % TICKS_PER_MINUTE
 
     @property
     def minutes(self):
-        return int(self._minutes)
+        return self._minutes
 
     @minutes.setter
     def minutes(self, value):
         assert value < 60
-        self._minutes = Decimal(value)
+        self._ticks += (int(value) - self._minutes) * TICKS_PER_MINUTE
 
     @property
     def hours(self):
-        return int(self._hours)
+        return self._hours
 
     @hours.setter
     def hours(self, value):
         assert value < 24
-        self._hours = Decimal(value)
+        self._ticks += (int(value) - self._hours) * TICKS_PER_HOUR
 
     @property
     def time(self):
-        return f"{str(self._hours) if self._hours >= 10 else '0' + str(self._hours)}:{str(self._minutes) if self._minutes >= 10 else '0' + str(self._minutes)}:{str(round(self._seconds, 2)) if self._seconds >= 10 else '0' + str(round(self._seconds, 2))}"
+        hours, ticks = divmod(self._ticks, TICKS_PER_HOUR)
+        minutes, ticks = divmod(ticks, TICKS_PER_MINUTE)
+        return f"{hours:02d}:{minutes:02d}:{ticks / TICKS_PER_SECOND:05.2f}"
 
     def add_time(self, dt: Dt):
-        new_seconds = self._seconds + Decimal(dt._seconds)
-        new_minutes = self._minutes + Decimal(dt._minutes) + Decimal(new_seconds//60)
-        new_seconds = new_seconds%60
-        hours = self._hours + Decimal(dt._hours) + Decimal(new_minutes//60)
-        new_minutes = new_minutes%60
-        new_seconds = new_seconds%60
-        assert hours <= 24
-
-        new_time = Time("")
-        new_time._hours = hours
-        new_time._minutes = new_minutes
-        new_time._seconds = new_seconds
-        return new_time
+        ticks = self._ticks + dt._ticks
+        assert ticks // TICKS_PER_HOUR <= 24
+        return Time.from_ticks(ticks)
 
     def remove_time(self, dt:Dt):
-        new_seconds = self._seconds - Decimal(dt._seconds%60)
-        new_minutes = self._minutes - (Decimal(dt._minutes) + Decimal(dt._seconds//60))
-        hours = self._hours - (Decimal(dt._hours) + Decimal(new_minutes//60))
-        new_minutes = new_minutes%60
-        new_seconds = new_seconds%60
-        if new_seconds < 0:
-            n = -new_seconds//60 + 1
-            new_seconds = 60*n + new_seconds%60
-            new_minutes -= n
-        if new_minutes < 0:
-            n = -new_minutes // 60 +1
-            new_minutes = 60*n + new_minutes%60
-            hours -= n
-
-        assert new_seconds >= 0, f"{new_seconds}"
-        assert new_minutes >= 0, f"{new_minutes}"
-        assert hours >= 0
-
-        new_time = Time("")
-        new_time._hours = hours
-        new_time._minutes = new_minutes
-        new_time._seconds = new_seconds
-        return new_time
+        ticks = self._ticks - dt._ticks
+        assert ticks >= 0, f"{ticks}"
+        return Time.from_ticks(ticks)
 
     def copy(self):
-        copy = Time()
-        copy._hours = self._hours
-        copy._minutes = self._minutes
-        copy._seconds = self._seconds
-
-        return copy
+        return Time.from_ticks(self._ticks)
 
 
 class TimeTable(object):
@@ -270,7 +282,7 @@ class TimeTable(object):
 
     @classmethod
     def create_table_freq(cls, start: str, end: str, dt:Dt):
-        assert dt._hours!=0 or dt._minutes!=0 or dt._seconds!=0
+        assert dt.ticks != 0
         table = []
         current_time = Time(start)
         end_time = Time(end)
@@ -0,0 +1,63 @@
+from typing import Tuple
+
+import numpy as np
+
+
+def linear_sum_assignment(costs) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Solve the linear sum assignment problem with the Hungarian algorithm, each row is assigned to at most
+    one column and each column to at most one row, such that as many rows (or columns) as possible are assigned
+    with the minimum total cost
+
+    Args:
+        costs: The finite cost matrix
+
+    Returns:
+        The assigned rows in increasing order and the corresponding columns
+    """
+    costs = np.asarray(costs, dtype=float)
+    transposed = costs.shape[0] > costs.shape[1]
+    if transposed:
+        costs = costs.T
+    nrows, ncols = costs.shape
+
+    # Potentials of the rows and columns, the column 0 is a dummy one from which the augmenting paths start
+    u = np.zeros(nrows + 1)
+    v = np.zeros(ncols + 1)
+    assigned_rows = np.zeros(ncols + 1, dtype=int)
+    previous_col = np.zeros(ncols + 1, dtype=int)
+
+    for row in range(1, nrows + 1):
+        assigned_rows[0] = row
+        col = 0
+        min_reduced_costs = np.full(ncols + 1, np.inf)
+        used = np.zeros(ncols + 1, dtype=bool)
+        while assigned_rows[col] != 0:
+            used[col] = True
+            current_row = assigned_rows[col]
+            free = ~used
+            reduced_costs = costs[current_row - 1] - u[current_row] - v[1:]
+            improved = free[1:] & (reduced_costs < min_reduced_costs[1:])
+            min_reduced_costs[1:][improved] = reduced_costs[improved]
+            previous_col[1:][improved] = col
+
+            candidates = np.where(free, min_reduced_costs, np.inf)
+            next_col = int(np.argmin(candidates[1:])) + 1
+            delta = candidates[next_col]
+            u[assigned_rows[used]] += delta
+            v[used] -= delta
+            min_reduced_costs[free] -= delta
+            col = next_col
+
+        # Augment the assignment along the path
+        while col != 0:
+            prev = previous_col[col]
+            assigned_rows[col] = assigned_rows[prev]
+            col = prev
+
+    cols = np.flatnonzero(assigned_rows[1:])
+    rows = assigned_rows[1:][cols] - 1
+    if transposed:
+        rows, cols = cols, rows
+    order = np.argsort(rows)
+    return rows[order], cols[order]
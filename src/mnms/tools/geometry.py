@@ -1,4 +1,6 @@
+from collections import defaultdict
 from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Tuple
 
 import numpy as np
 
@@ -36,3 +38,200 @@ def points_in_polygon(polygon, pts):
     mask3 = ~(count % 2 == 0)
     mask = mask1 | mask2 | mask3
     return mask
+
+
+class LinkPosition(object):
+    __slots__ = ('_graph_nodes', 'link', 'remaining_length', '_position')
+
+    def __init__(self, graph_nodes, link: Tuple[str, str], remaining_length: float):
+        """
+        Position on a link, only computed the first time it is read
+
+        Args:
+            graph_nodes: The nodes of the graph
+            link: The upstream and downstream nodes of the link
+            remaining_length: The length left to reach the downstream node
+        """
+        self._graph_nodes = graph_nodes
+        self.link: Tuple[str, str] = link
+        self.remaining_length: float = remaining_length
+        self._position: Optional[np.ndarray] = None
+
+    @property
+    def position(self) -> np.ndarray:
+        if self._position is None:
+            unode, dnode = self.link
+            unode_pos = np.array(self._graph_nodes[unode].position)
+            dnode_pos = np.array(self._graph_nodes[dnode].position)
+
+            direction = dnode_pos - unode_pos
+            norm_direction = np.linalg.norm(direction)
+            if norm_direction > 0:
+                normalized_direction = direction / norm_direction
+                travelled = norm_direction - self.remaining_length
+            else:
+                normalized_direction = direction
+                travelled = 0
+            self._position = unode_pos + normalized_direction * travelled
+        return self._position
+
+
+class GridIndex(object):
+    def __init__(self, positions, cell_size: Optional[float] = None):
+        """
+        Uniform grid spatial index on a set of 2D points, used for exact nearest neighbour queries
+
+        Args:
+            positions: The positions of the indexed points
+            cell_size: The size of the grid cells, if None (or not positive) it is chosen to have about two points
+                per cell
+        """
+        self.positions = np.asarray(positions, dtype=float).reshape(-1, 2)
+        self._origin = self.positions.min(axis=0) if len(self.positions) else np.zeros(2)
+
+        if cell_size is None or cell_size <= 0:
+            extent = self.positions.max(axis=0) - self._origin if len(self.positions) else np.zeros(2)
+            area = max(extent[0], 1.) * max(extent[1], 1.)
+            cell_size = max(np.sqrt(2 * area / max(len(self.positions), 1)), 1e-9)
+        self.cell_size = float(cell_size)
+
+        cell_points = defaultdict(list)
+        for i, cell in enumerate(map(tuple, self._get_cells(self.positions).tolist())):
+            cell_points[cell].append(i)
+        self._cells: Dict[Tuple[int, int], np.ndarray] = {cell: np.array(points, dtype=np.int64)
+                                                          for cell, points in cell_points.items()}
+        self._cell_keys = np.array(list(self._cells.keys()), dtype=np.int64).reshape(-1, 2)
+        self._cell_points = list(self._cells.values())
+
+    def __len__(self):
+        return len(self.positions)
+
+    def _get_cells(self, positions: np.ndarray) -> np.ndarray:
+        return np.floor((positions - self._origin) / self.cell_size).astype(np.int64)
+
+    def _get_ring_points(self, cell: Tuple[int, int], ring: int) -> np.ndarray:
+        # Points of the cells at a Chebyshev distance lower or equal than ring from cell
+        if (2 * ring + 1) ** 2 <= len(self._cells):
+            cx, cy = cell
+            points = [self._cells[(x, y)]
+                      for x in range(cx - ring, cx + ring + 1)
+                      for y in range(cy - ring, cy + ring + 1)
+                      if (x, y) in self._cells]
+        else:
+            in_ring = np.abs(self._cell_keys - cell).max(axis=1) <= ring
+            points = [self._cell_points[i] for i in np.flatnonzero(in_ring).tolist()]
+        return np.sort(np.concatenate(points)) if points else np.empty(0, dtype=np.int64)
+
+    def within(self, positions, radius: float) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Find the indexed points strictly closer than radius of each position
+
+        Args:
+            positions: The positions to query
+            radius: The radius of the query
+
+        Returns:
+            For each position, the sorted indexes of the points in the radius and their distances
+        """
+        positions = np.asarray(positions, dtype=float).reshape(-1, 2)
+        result = [None] * len(positions)
+
+        query_cells = defaultdict(list)
+        for i, cell in enumerate(map(tuple, self._get_cells(positions).tolist())):
+            query_cells[cell].append(i)
+
+        # The points of the cells further than ring are at least at (ring * cell_size) of the queries
+        ring = max(int(np.ceil(radius / self.cell_size)), 0)
+        for cell, queries in query_cells.items():
+            candidates = self._get_ring_points(cell, ring)
+            candidates_pos = self.positions[candidates]
+            for i in queries:
+                dist = np.linalg.norm(candidates_pos - positions[i], axis=1)
+                mask = dist < radius
+                result[i] = (candidates[mask], dist[mask])
+
+        return result
+
+    def iter_nearest(self, position) -> Iterator[Tuple[int, float]]:
+        """
+        Iterate over the indexed points by increasing distance to a position, the rings of cells are only
+        explored as the iteration goes. Ties are broken in favor of the first indexed point
+
+        Args:
+            position: The position to query
+
+        Yields:
+            The index of the point and its distance to the position
+        """
+        if len(self.positions) == 0:
+            return
+        position = np.asarray(position, dtype=float).reshape(2)
+        cell = tuple(self._get_cells(position[None, :])[0].tolist())
+        cell_rings = np.abs(self._cell_keys - cell).max(axis=1)
+        last_ring = int(cell_rings.max())
+
+        pending_points = np.empty(0, dtype=np.int64)
+        pending_dist = np.empty(0)
+        ring = int(cell_rings.min())
+        while True:
+            points = [self._cell_points[i] for i in np.flatnonzero(cell_rings == ring).tolist()]
+            if points:
+                points = np.concatenate(points)
+                pending_points = np.concatenate([pending_points, points])
+                pending_dist = np.concatenate([pending_dist, np.linalg.norm(self.positions[points] - position, axis=1)])
+                order = np.lexsort((pending_points, pending_dist))
+                pending_points = pending_points[order]
+                pending_dist = pending_dist[order]
+
+            # The points of the next rings are at least at (ring * cell_size) of the position
+            nb_final = len(pending_points) if ring >= last_ring else np.searchsorted(pending_dist, ring * self.cell_size)
+            for i, dist in zip(pending_points[:nb_final].tolist(), pending_dist[:nb_final].tolist()):
+                yield i, dist
+            if ring >= last_ring:
+                return
+            pending_points = pending_points[nb_final:]
+            pending_dist = pending_dist[nb_final:]
+            ring += 1
+
+    def nearest(self, positions) -> np.ndarray:
+        """
+        Find the nearest indexed point of each position. Ties are broken in favor of the first indexed point
+
+        Args:
+            positions: The positions to query
+
+        Returns:
+            The index of the nearest indexed point for each position
+        """
+        positions = np.asarray(positions, dtype=float).reshape(-1, 2)
+        result = np.empty(len(positions), dtype=np.int64)
+        if len(positions) == 0:
+            return result
+        assert len(self.positions) > 0, "Cannot query an empty GridIndex"
+
+        cells = self._get_cells(positions)
+        query_cells = defaultdict(list)
+        for i, cell in enumerate(map(tuple, cells.tolist())):
+            query_cells[cell].append(i)
+
+        for cell, queries in query_cells.items():
+            queries = np.array(queries, dtype=np.int64)
+
+            # Start from the first ring containing an occupied cell, the direct neighbours are usually enough
+            if cell in self._cells:
+                ring = 1
+            else:
+                ring = max(int(np.abs(self._cell_keys - cell).max(axis=1).min()), 1)
+            candidates = self._get_ring_points(cell, ring)
+            dist = np.linalg.norm(self.positions[candidates][None, :, :] - positions[queries][:, None, :], axis=2)
+
+            # The points outside the rings are at least at (ring * cell_size) of the queries
+            min_dist = dist.min(axis=1).max()
+            if min_dist > ring * self.cell_size:
+                ring = int(np.ceil(min_dist / self.cell_size))
+                candidates = self._get_ring_points(cell, ring)
+                dist = np.linalg.norm(self.positions[candidates][None, :, :] - positions[queries][:, None, :], axis=2)
+
+            result[queries] = candidates[np.argmin(dist, axis=1)]
+
+        return result
@@ -1,6 +1,6 @@
 import sys
 from abc import ABC, abstractmethod
-from typing import List, Set, Dict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
 import csv
 import multiprocessing
 
@@ -27,16 +27,17 @@ def _process_shortest_path_inputs(mlgraph: MultiLayerGraph, users):
     available_layers = [None] * len(users)
     chosen_mservice = [None] * len(users)
 
-    origins_id = list(odlayer.origins.keys())
-    origins_pos = np.array([position for position in odlayer.origins.values()])
-    destinations_id = list(odlayer.destinations.keys())
-    destinations_pos = np.array([position for position in odlayer.destinations.values()])
+    # Users with coordinates are snapped to the OD layer all at once
+    coordinate_users = [i for i, u in enumerate(users) if isinstance(u.origin, np.ndarray)]
+    if coordinate_users:
+        snapped_origins = odlayer.nearest_origins([users[i].origin for i in coordinate_users])
+        snapped_destinations = odlayer.nearest_destinations([users[i].destination for i in coordinate_users])
+        for i, origin, destination in zip(coordinate_users, snapped_origins, snapped_destinations):
+            origins[i] = origin
+            destinations[i] = destination
 
     for i, u in enumerate(users):
-        if isinstance(u.origin, np.ndarray):
-            origins[i] = origins_id[np.argmin(_norm(origins_pos - u.origin, axis=1))]
-            destinations[i] = destinations_id[np.argmin(_norm(destinations_pos - u.destination, axis=1))]
-        else:
+        if not isinstance(u.origin, np.ndarray):
             origins[i] = u.origin
             destinations[i] = u.destination
 
@@ -70,7 +71,8 @@ class AbstractDecisionModel(ABC):
                  outfile: str = None,
                  verbose_file: bool = False,
                  cost: str = 'travel_time',
-                 thread_number: int = multiprocessing.cpu_count()):
+                 thread_number: int = multiprocessing.cpu_count(),
+                 cache_paths: bool = False):
 
         """
         Base class for a travel decision model
@@ -85,6 +87,8 @@ class AbstractDecisionModel(ABC):
             verbose_file: If true write all the computed shortest path, not only the one that is selected
             cost: The name of the cost to consider for the shortest path
             thread_number: The number of thread to user fot parallel shortest path computation
+            cache_paths: If True, the shortest paths are cached by origin, destination, layers and services
+                until `invalidate_path_cache` is called
         """
 
         self._n_shortest_path = n_shortest_path
@@ -100,6 +104,12 @@ class AbstractDecisionModel(ABC):
 
         self._refused_user: List[User] = list()
 
+        self._cache_paths = cache_paths
+        self._path_cache: Dict[Tuple, List[Tuple[List[str], float]]] = dict()
+        self._path_cache_links: Dict[Tuple, Set[str]] = dict()
+        self.path_cache_hits: int = 0
+        self.path_cache_misses: int = 0
+
         if outfile is None:
             self._write = False
             self._verbose_file = False
@@ -119,16 +129,77 @@ class AbstractDecisionModel(ABC):
     def set_refused_users(self, users: List[User]):
         self._refused_user.extend(users)
 
+    def invalidate_path_cache(self, updated_links: Optional[Iterable[str]] = None):
+        """
+        Remove the cached paths that may not be the shortest anymore after a cost update. Note that with
+        updated_links, only the paths going through an updated link are removed
+
+        Args:
+            updated_links: The ids of the links whose costs have been updated, all paths are removed if None
+        """
+        if updated_links is None:
+            self._path_cache.clear()
+            self._path_cache_links.clear()
+            return
+
+        updated_links = set(updated_links)
+        for key in [key for key, links in self._path_cache_links.items() if not links.isdisjoint(updated_links)]:
+            del self._path_cache[key]
+            del self._path_cache_links[key]
+
+    def _compute_k_shortest_paths(self, origins: List[str], destinations: List[str], available_layers: List[Set[str]], chosen_services: List[Dict[str, str]]) -> List[List[Tuple[List[str], float]]]:
+        # Identical queries are computed once and their paths are copied for each user, the Path objects of the
+        # users must not share their nodes
+        keys = [(o, d, tuple(sorted(services.items())), frozenset(layers), self._cost)
+                for o, d, services, layers in zip(origins, destinations, chosen_services, available_layers)]
+        paths = [None] * len(keys)
+        queries: Dict[Tuple, List[int]] = dict()
+        for i, key in enumerate(keys):
+            kpath = self._path_cache.get(key) if self._cache_paths else None
+            if kpath is None:
+                queries.setdefault(key, []).append(i)
+            else:
+                paths[i] = [(list(nodes), cost) for nodes, cost in kpath]
+
+        if self._cache_paths:
+            self.path_cache_misses += len(queries)
+            self.path_cache_hits += len(keys) - len(queries)
+
+        if queries:
+            first_users = [users[0] for users in queries.values()]
+            log.info(f"Computing shortest paths for {len(first_users)} unique queries out of {len(keys)} users")
+            query_paths = parallel_k_shortest_path(self._mlgraph.graph,
+                                                   [origins[i] for i in first_users],
+                                                   [destinations[i] for i in first_users],
+                                                   self._cost,
+                                                   [chosen_services[i] for i in first_users],
+                                                   [available_layers[i] for i in first_users],
+                                                   self._min_diff_dist,
+                                                   self._max_diff_dist,
+                                                   self._n_shortest_path,
+                                                   self._thread_number)
+            gnodes = self._mlgraph.graph.nodes
+            for (key, users), kpath in zip(queries.items(), query_paths):
+                paths[users[0]] = kpath
+                for i in users[1:]:
+                    paths[i] = [(list(nodes), cost) for nodes, cost in kpath]
+                # A query without any path is not cached, as it is not dropped by the invalidation of some links
+                if self._cache_paths and any(nodes for nodes, _ in kpath):
+                    self._path_cache[key] = [(list(nodes), cost) for nodes, cost in kpath]
+                    self._path_cache_links[key] = {gnodes[unode].adj[dnode].id
+                                                   for nodes, _ in kpath
+                                                   for unode, dnode in zip(nodes[:-1], nodes[1:])}
+
+        return paths
+
     def _check_refused_users(self, tcurrent) -> List[User]:
         new_users = []
         gnodes = self._mlgraph.graph.nodes
         for u in self._refused_user:
             upath = u.path.nodes
-            ind_node_start = upath.index(u._current_node)
-            for ilayer, (layer, slice_nodes) in enumerate(u.path.layers):
-                if slice_nodes.start <= ind_node_start < slice_nodes.stop:
-                    refused_mservice = u.path.mobility_services[ilayer]
-                    break
+            _, ilayer = u.path_cursor
+            if ilayer is not None:
+                refused_mservice = u.path.mobility_services[ilayer]
             else:
                 print("Mobility service not found in User path")
                 sys.exit(-1)
@@ -172,16 +243,7 @@ class AbstractDecisionModel(ABC):
         new_users.extend(legacy_users)
 
         origins, destinations, available_layers, chosen_services = _process_shortest_path_inputs(self._mlgraph, new_users)
-        paths = parallel_k_shortest_path(self._mlgraph.graph,
-                                         origins,
-                                         destinations,
-                                         self._cost,
-                                         chosen_services,
-                                         available_layers,
-                                         self._min_diff_dist,
-                                         self._max_diff_dist,
-                                         self._n_shortest_path,
-                                         self._thread_number)
+        paths = self._compute_k_shortest_paths(origins, destinations, available_layers, chosen_services)
         gnodes = self._mlgraph.graph.nodes
         path_not_found = []
 
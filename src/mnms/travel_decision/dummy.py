@@ -6,7 +6,7 @@ from mnms.travel_decision.abstract import AbstractDecisionModel
 
 
 class DummyDecisionModel(AbstractDecisionModel):
-    def __init__(self, mmgraph: MultiLayerGraph, outfile:str=None, cost='travel_time', verbose_file=False):
+    def __init__(self, mmgraph: MultiLayerGraph, outfile:str=None, cost='travel_time', verbose_file=False, cache_paths=False):
         """
         Simple decision model that choose the first path of the ls
         
@@ -15,9 +15,10 @@ class DummyDecisionModel(AbstractDecisionModel):
             outfile:
             cost:
             verbose_file:
+            cache_paths:
         """
         super(DummyDecisionModel, self).__init__(mmgraph, n_shortest_path=1, outfile=outfile, verbose_file=verbose_file,
-                                                 cost=cost)
+                                                 cost=cost, cache_paths=cache_paths)
 
     def path_choice(self, paths:List[Path]) -> Path:
         return paths[0]
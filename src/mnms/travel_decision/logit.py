@@ -14,7 +14,7 @@ log = create_logger(__name__)
 
 
 class LogitDecisionModel(AbstractDecisionModel):
-    def __init__(self, mmgraph: MultiLayerGraph, theta=0.01, n_shortest_path=3, cost='travel_time', outfile:str=None, verbose_file=False):
+    def __init__(self, mmgraph: MultiLayerGraph, theta=0.01, n_shortest_path=3, cost='travel_time', outfile:str=None, verbose_file=False, cache_paths=False):
         """Logit decision model for the path of a user
 
         Args:
@@ -22,9 +22,10 @@ class LogitDecisionModel(AbstractDecisionModel):
         theta: Parameter of the logit
         n_shortest_path: Number of shortest path top compute
         outfile: Path to result CSV file, nothing is written if None
+        cache_paths: If True, cache the shortest paths between affectation steps
         """
         super(LogitDecisionModel, self).__init__(mmgraph, n_shortest_path=n_shortest_path, outfile=outfile,
-                                                 verbose_file=verbose_file, cost=cost)
+                                                 verbose_file=verbose_file, cost=cost, cache_paths=cache_paths)
         self._theta = theta
 
     def path_choice(self, paths:List[Path]) -> Path:
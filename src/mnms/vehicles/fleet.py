@@ -1,4 +1,8 @@
-from typing import Type, Dict, Optional, List
+from typing import Type, Dict, Iterator, Optional, List, Tuple
+
+import numpy as np
+
+from mnms.tools.geometry import GridIndex
 
 from mnms.vehicles.manager import VehicleManager
 from mnms.vehicles.veh_type import Vehicle, VehicleActivity, VehicleActivityStop
@@ -20,8 +24,19 @@ class FleetManager(object):
         self._constructor: Type[Vehicle] = veh_type
         self._mobility_service = mobility_service
 
+        # Deleted vehicles, recycled by the next calls to create_vehicle
+        self._pool: List[Vehicle] = list()
+
+        # Spatial index of the vehicles by availability, only kept while the vehicles do not move
+        self._keep_position_index: bool = False
+        self._position_index: Optional[Dict[str, Tuple[List[Vehicle], GridIndex]]] = None
+
     def create_vehicle(self, node: str, capacity: int, activities: Optional[List[VehicleActivity]]):
-        new_veh = self._constructor(node, capacity, self._mobility_service, activities=activities)
+        if self._pool:
+            new_veh = self._pool.pop()
+            new_veh.reset(node, capacity, self._mobility_service, activities=activities)
+        else:
+            new_veh = self._constructor(node, capacity, self._mobility_service, activities=activities)
         self.vehicles[new_veh.id] = new_veh
         self.__veh_manager.add_vehicle(new_veh)
         return new_veh
@@ -30,8 +45,60 @@ class FleetManager(object):
         return self.create_vehicle(node, capacity, [VehicleActivityStop(node, is_done=False)])
 
     def delete_vehicle(self, vehid:str):
-        self.__veh_manager.remove_vehicle(self.vehicles[vehid])
-        del self.vehicles[vehid]
+        veh = self.vehicles.pop(vehid)
+        self.__veh_manager.remove_vehicle(veh)
+        self._pool.append(veh)
+
+    def _create_position_index(self) -> Dict[str, Tuple[List[Vehicle], GridIndex]]:
+        empty_vehicles = [veh for veh in self.vehicles.values() if veh.is_empty]
+        not_full_vehicles = [veh for veh in self.vehicles.values() if not veh.is_full]
+        return {"empty": (empty_vehicles, GridIndex([veh.position for veh in empty_vehicles])),
+                "not_full": (not_full_vehicles, GridIndex([veh.position for veh in not_full_vehicles]))}
+
+    def keep_position_index(self):
+        """
+        Use a spatial index of the vehicles in `nearest_vehicles`, built by its next call and kept until
+        `clear_position_index` is called, so the vehicles must not move in between. Otherwise the vehicles
+        are scanned at each call
+        """
+        self._keep_position_index = True
+
+    def clear_position_index(self):
+        self._keep_position_index = False
+        self._position_index = None
+
+    def nearest_vehicles(self, position, availability: str = "empty") -> Iterator[Vehicle]:
+        """
+        Iterate over the available vehicles by increasing distance to a position, ties are broken with the
+        order of creation of the vehicles
+
+        Args:
+            position: The position
+            availability: Either 'empty' or 'not_full'
+
+        Yields:
+            The available vehicles
+        """
+        if not self._keep_position_index:
+            # Building the index for one query costs more than a plain scan of the vehicles
+            if availability == "empty":
+                vehicles = [veh for veh in self.vehicles.values() if veh.is_empty]
+            else:
+                vehicles = [veh for veh in self.vehicles.values() if not veh.is_full]
+            if vehicles:
+                dist = np.linalg.norm(np.array([veh.position for veh in vehicles]) - position, axis=1)
+                for i in np.argsort(dist, kind='stable').tolist():
+                    yield vehicles[i]
+            return
+
+        if self._position_index is None:
+            self._position_index = self._create_position_index()
+        vehicles, index = self._position_index[availability]
+        for i, _ in index.iter_nearest(position):
+            veh = vehicles[i]
+            # The availability of the vehicle may have changed since the index was built
+            if veh.is_empty if availability == "empty" else not veh.is_full:
+                yield veh
 
     def vehicle_type(self):
         return self._constructor.__name__ if self._constructor is not None else None
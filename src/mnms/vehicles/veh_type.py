@@ -1,12 +1,12 @@
 from abc import ABC, abstractmethod
 from collections import deque
-from copy import deepcopy
-from typing import List, Tuple, Deque, Optional, Generator, Callable
+from typing import List, Tuple, Deque, Optional, Generator, Callable, Union
 from enum import Enum
 from dataclasses import dataclass, field
 
 import numpy as np
 
+from mnms.tools.geometry import LinkPosition
 from mnms.tools.observer import TimeDependentSubject
 from mnms.log import create_logger
 from mnms.time import Time
@@ -54,8 +54,9 @@ class VehicleActivity(ABC):
         return None
 
     def copy(self):
-        return self.__class__(deepcopy(self.node),
-                              deepcopy(self.path),
+        # A path is never modified in place but replaced with modify_path, so the copies share it
+        return self.__class__(self.node,
+                              self.path,
                               self.user,
                               self.is_done)
 
@@ -94,7 +95,7 @@ class VehicleActivityPickup(VehicleActivity):
     def done(self, veh: "Vehicle"):
         self.user._waiting_vehicle = False
         self.user._vehicle = veh
-        veh.passenger[self.user.id] = self.user
+        veh.add_passenger(self.user)
         self.user.set_state_inside_vehicle()
 
 
@@ -105,19 +106,19 @@ class VehicleActivityServing(VehicleActivity):
     def start(self, veh: "Vehicle"):
         self.user._waiting_vehicle = False
         self.user._vehicle = veh
-        veh.passenger[self.user.id] = self.user
+        veh.add_passenger(self.user)
         self.user.set_state_inside_vehicle()
 
     def done(self, veh: "Vehicle"):
         self.user._waiting_vehicle = False
         self.user._vehicle = None
-        veh.passenger.pop(self.user.id)
+        veh.remove_passenger(self.user.id)
 
         self.user._remaining_link_length = 0
         upath = self.user.path.nodes
         unode = veh._current_link[1] if veh._current_link is not None else veh._current_node
         self.user._current_node = unode
-        next_node_ind = upath.index(unode)+1
+        next_node_ind = self.user.path.node_index(unode)+1
         self.user.set_position((unode, upath[next_node_ind]), 0, veh.position)
         self.user._vehicle = None
         # self.user._vehicle = None
@@ -146,6 +147,25 @@ class Vehicle(TimeDependentSubject):
         """
 
         super(Vehicle, self).__init__()
+        self.reset(node, capacity, mobility_service, initial_speed, activities)
+
+    def reset(self,
+              node: str,
+              capacity: int,
+              mobility_service: str,
+              initial_speed: float = 13.8,
+              activities: Optional[List[VehicleActivity]] = None):
+        """
+        Reinitialize the Vehicle as if it was just created, it gets a new global id and loses its observers
+
+        Args:
+            node: The node where the Vehicle is created
+            capacity: the capacity of the Vehicle
+            mobility_service: The associated mobility service
+            initial_speed: the initial speed of the Vehicle
+            activities: The initial activities of the Vehicle
+        """
+        self._observers = []
         self._global_id = str(Vehicle._counter)
         Vehicle._counter += 1
 
@@ -203,7 +223,8 @@ class Vehicle(TimeDependentSubject):
 
     @property
     def position(self):
-        return self._position
+        position = self._position
+        return position.position if isinstance(position, LinkPosition) else position
 
     @property
     def state(self) -> VehicleState:
@@ -254,38 +275,68 @@ class Vehicle(TimeDependentSubject):
         self._current_link, self._remaining_link_length = next(self._iter_path)
 
     def update_distance(self, dist: float):
+        # The distance of the passengers is derived from the distance of the vehicle, see add_passenger
         self._distance += dist
-        for user in self.passenger.values():
-            user.update_distance(dist)
 
-    def set_position(self, position: np.ndarray):
+    def add_passenger(self, user: "User"):
+        """
+        Board a User, its distance follows the distance of the vehicle until it is removed
+
+        Args:
+            user: The user
+        """
+        self.passenger[user.id] = user
+        user.start_riding(self)
+
+    def remove_passenger(self, uid: str) -> "User":
+        """
+        Remove a passenger, the distance travelled in the vehicle is added to its distance
+
+        Args:
+            uid: The id of the user
+
+        Returns:
+            The removed user
+        """
+        user = self.passenger.pop(uid)
+        user.stop_riding()
+        return user
+
+    def set_position(self, position: Union[np.ndarray, LinkPosition]):
         self._position = position
 
+    def set_passengers_position(self):
+        """
+        Put the passengers at the position of the vehicle, a lazy position is shared with them without
+        being computed
+        """
+        for passenger in self.passenger.values():
+            passenger.set_position(self._current_link, self._remaining_link_length, self._position)
+
     def drop_user(self, tcurrent:Time, user:'User', drop_pos:np.ndarray):
         log.info(f"{user} is dropped at {self._current_link[0]}")
         user._remaining_link_length = 0
         upath = user.path.nodes
         unode = self._current_link[0]
         user._current_node = unode
-        next_node_ind = upath.index(unode)+1
+        next_node_ind = user.path.node_index(unode)+1
         user.set_position((unode, upath[next_node_ind]), 0, drop_pos)
         user._vehicle = None
         user.notify(tcurrent)
 
-        del self.passenger[user.id]
+        self.remove_passenger(user.id)
 
     def drop_all_passengers(self, tcurrent:Time):
-        for _, user in self.passenger.values():
-            log.info(f"{user} is dropped at {self._current_link[1]}")
-            unode = self._current_link[1]
+        unode = self._current_link[1]
+        for uid in list(self.passenger):
+            user = self.remove_passenger(uid)
+            log.info(f"{user} is dropped at {unode}")
             user._current_node = unode
             user._remaining_link_length = 0
             user._position = self._position
             user.notify(tcurrent)
             user._vehicle = None
 
-        self.passenger = dict()
-
     def start_user_trip(self, userid, take_node):
         log.info(f'Passenger {userid} has been taken by {self} at {take_node}')
         take_time, user = self._next_passenger.pop(userid)
@@ -0,0 +1,83 @@
+import unittest
+
+from mnms.demand.user import Path, User
+from mnms.time import Time
+from mnms.vehicles.manager import VehicleManager
+from mnms.vehicles.veh_type import Car, Vehicle
+
+
+class TestPath(unittest.TestCase):
+    def setUp(self):
+        self.path = Path(0, 10, ["A", "B", "C", "B", "D"])
+
+    def tearDown(self):
+        pass
+
+    def test_node_index(self):
+        for node in ["A", "B", "C", "D"]:
+            self.assertEqual(self.path.nodes.index(node), self.path.node_index(node))
+
+        with self.assertRaises(ValueError):
+            self.path.node_index("E")
+
+    def test_set_nodes(self):
+        self.path.node_index("A")
+        self.path.nodes = ["E", "A"]
+        self.assertEqual(1, self.path.node_index("A"))
+
+    def test_layer_index(self):
+        self.path.layers = [("CAR", slice(1, 2, 1)), ("BUS", slice(2, 4, 1))]
+        self.assertEqual([None, 0, 1, 1, None], [self.path.layer_index(i) for i in range(5)])
+
+
+class TestUserPathCursor(unittest.TestCase):
+    def test_path_cursor(self):
+        path = Path(0, 10, ["A", "B", "C", "D", "E"])
+        path.layers = [("CAR", slice(1, 2, 1)), ("BUS", slice(2, 4, 1))]
+        user = User("U0", "A", "E", Time("07:00:00"), path=path)
+        self.assertEqual((0, None), user.path_cursor)
+
+        user._current_node = "C"
+        self.assertEqual((2, 1), user.path_cursor)
+
+        new_path = Path(0, 10, ["C", "B", "E"])
+        new_path.layers = [("CAR", slice(0, 2, 1))]
+        user.set_path(new_path)
+        self.assertEqual((0, 0), user.path_cursor)
+
+
+class TestUserDistance(unittest.TestCase):
+    def tearDown(self):
+        VehicleManager.empty()
+        Vehicle._counter = 0
+
+    def test_distance_in_vehicle(self):
+        user = User("U0", "A", "E", Time("07:00:00"))
+        user.update_distance(10)
+        veh = Car("A", 4, "Uber")
+        veh.update_distance(100)
+
+        veh.add_passenger(user)
+        veh.update_distance(30)
+        veh.update_distance(20)
+        self.assertAlmostEqual(60, user.distance)
+
+        veh.remove_passenger("U0")
+        veh.update_distance(40)
+        self.assertAlmostEqual(60, user.distance)
+        self.assertEqual({}, veh.passenger)
+
+    def test_distance_drop_all_passengers(self):
+        users = [User(uid, "A", "E", Time("07:00:00")) for uid in ["U0", "U1"]]
+        veh = Car("A", 4, "Uber")
+        veh._current_link = ("A", "B")
+        for user in users:
+            veh.add_passenger(user)
+        veh.update_distance(30)
+
+        veh.drop_all_passengers(Time("07:00:00"))
+        veh.update_distance(40)
+        for user in users:
+            self.assertAlmostEqual(30, user.distance)
+            self.assertEqual("B", user._current_node)
+        self.assertEqual({}, veh.passenger)
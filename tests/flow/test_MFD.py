@@ -94,6 +94,54 @@ class TestMFDFlow(unittest.TestCase):
         self.assertIn(None, self.flow.dict_speeds)
         self.assertEqual('09:00:00.00', self.flow.time)
 
+    def test_link_to_reservoir(self):
+        self.assertEqual('res1', self.flow._link_to_reservoir[('C0', 'C1')])
+        self.assertEqual('res1', self.flow._link_to_reservoir[('C0', 'C2')])
+        self.assertEqual('res1', self.flow._link_to_reservoir[('L1_B2', 'L1_B3')])
+        self.assertEqual('res2', self.flow._link_to_reservoir[('L1_B3', 'L1_B4')])
+        self.assertNotIn(('C2', 'L1_B2'), self.flow._link_to_reservoir)
+
+        veh = Vehicle('C0', 1, 'PersonalVehicle')
+        veh._current_link = ('C0', 'C2')
+        self.assertEqual('res1', self.flow.get_vehicle_zone(veh))
+        veh._current_link = ('C2', 'L1_B2')
+        veh.set_position(np.array([1300, 0]))
+        self.assertEqual('res1', self.flow.get_vehicle_zone(veh))
+
+    def test_update_graph(self):
+        self.assertEqual(['res1', 'res2', None], self.flow._reservoir_columns)
+        np.testing.assert_array_equal([40000, 1200], self.flow._link_section_matrices['CAR'].total_length)
+
+        self.flow.step(Dt(seconds=1))
+        self.flow.update_graph()
+
+        links = self.mlgraph.graph.links
+        self.assertAlmostEqual(42, links['C0_C2'].costs['PersonalVehicle']['speed'])
+        self.assertAlmostEqual(1200 / 42, links['C0_C2'].costs['PersonalVehicle']['travel_time'])
+        self.assertAlmostEqual(0.23, links['L1_B3_B4'].costs['Bus']['speed'])
+        self.assertAlmostEqual(42, self.mlgraph.layers['CAR'].graph.links['C0_C1'].costs['PersonalVehicle']['speed'])
+
+    def test_update_graph_speed_tolerance(self):
+        self.flow._speed_tolerance = 0.1
+        self.flow.step(Dt(seconds=1))
+        self.flow.update_graph()
+        self.assertEqual(4, self.flow.nb_updated_links)
+        self.assertEqual(0, self.flow.nb_skipped_links)
+
+        self.flow.reservoirs['res2'].f_speed = lambda x: {k: 0.24 for k in x}
+        self.flow.step(Dt(seconds=1))
+        self.flow.update_graph()
+        self.assertEqual(4, self.flow.nb_updated_links)
+        self.assertEqual(4, self.flow.nb_skipped_links)
+        self.assertAlmostEqual(0.23, self.mlgraph.graph.links['L1_B3_B4'].costs['Bus']['speed'])
+
+        self.flow.reservoirs['res2'].f_speed = lambda x: {k: 0.3 for k in x}
+        self.flow.step(Dt(seconds=1))
+        self.flow.update_graph()
+        self.assertEqual(5, self.flow.nb_updated_links)
+        self.assertEqual(7, self.flow.nb_skipped_links)
+        self.assertAlmostEqual(0.3, self.mlgraph.graph.links['L1_B3_B4'].costs['Bus']['speed'])
+
     def test_accumulation_speed(self):
         user = User('U0', '0', '4', Time('00:01:00'))
         user.set_path(Path(0,
@@ -208,4 +256,57 @@ def test_move_veh_res_change():
     assert approx_dist == pytest.approx(veh.distance)
 
     VehicleManager.empty()
-    Vehicle._counter = 0
\ No newline at end of file
+    Vehicle._counter = 0
+
+def test_vectorized_vehicles_move():
+    results = []
+    for vectorized in [False, True]:
+        roads = generate_line_road([0, 0], [0, 20], 3)
+        roads.add_zone(construct_zone_from_sections(roads, "LEFT", ["0_1"]))
+        roads.add_zone(construct_zone_from_sections(roads, "RIGHT", ["1_2"]))
+
+        personal_car = PersonalMobilityService()
+        car_layer = generate_layer_from_roads(roads,
+                                              "CarLayer",
+                                              mobility_services=[personal_car])
+
+        odlayer = _generate_matching_origin_destination_layer(roads)
+
+        mlgraph = MultiLayerGraph([car_layer],
+                                  odlayer,
+                                  1e-3)
+
+        flow = MFDFlowMotor(vectorized_vehicles=vectorized)
+        flow.set_graph(mlgraph)
+
+        res1 = Reservoir(roads.zones["LEFT"], ["CAR"], lambda x: {k: 3 for k in x})
+        res2 = Reservoir(roads.zones['RIGHT'], ["CAR"], lambda x: {k: 2 for k in x})
+
+        flow.add_reservoir(res1)
+        flow.add_reservoir(res2)
+        flow.set_time(Time('09:00:00'))
+
+        flow.initialize(1.42)
+
+        user = User('U0', '0', '4', Time('00:01:00'))
+        user.set_path(Path(0,
+                           3400,
+                           ['CarLayer_0', 'CarLayer_1', 'CarLayer_2']))
+        personal_car.request_vehicle(user, 'C2')
+        personal_car.matching(user, "CarLayer_2")
+
+        veh = list(personal_car.fleet.vehicles.values())[0]
+        states = []
+        for _ in range(5):
+            flow.step(Dt(seconds=1))
+            flow.update_time(Dt(seconds=1))
+            states.append((veh.current_link, veh.remaining_link_length, veh.distance, user.distance, *veh.position,
+                           flow.dict_accumulations['LEFT']['CAR'], flow.dict_accumulations['RIGHT']['CAR']))
+        results.append(states)
+
+        VehicleManager.empty()
+        Vehicle._counter = 0
+
+    for state, vectorized_state in zip(*results):
+        assert state[0] == vectorized_state[0]
+        assert state[1:] == pytest.approx(vectorized_state[1:])
@@ -133,6 +133,32 @@ class TestCostsFunctions(unittest.TestCase):
             elif lid in ['L1_B2_B3', 'L1_B1_B2']:
                 self.assertAlmostEqual(link.costs["Bus"]['generalized_cost'], 0.003 * 1450 / 7)
 
+    def test_batch_cost_functions(self):
+        def gc_car(mlgraph, link_ids, costs, car_kmcost=0.0005, vot=0.003):
+            return costs['length'] * car_kmcost + vot * costs['travel_time']
+
+        def gc_walk(mlgraph, link_ids, costs, vot=0.003):
+            return vot * costs['length'] / costs['speed']
+
+        self.mlgraph.add_cost_function('CAR', 'batch_generalized_cost', gc_car, batch=True)
+        self.mlgraph.add_cost_function('TRANSIT', 'batch_generalized_cost', gc_walk, batch=True)
+        self.assertIn("batch_generalized_cost", self.mlgraph.layers['CAR']._batch_costs_functions["PersonalVehicle"])
+        self.assertNotIn("batch_generalized_cost", self.mlgraph.layers['CAR']._costs_functions["PersonalVehicle"])
+
+        self.flow.initialize(1.42)
+        links = self.mlgraph.graph.links
+        self.assertAlmostEqual(links['C0_C1'].costs["PersonalVehicle"]['batch_generalized_cost'], 0.003 * 2000 / 8.33 + 0.0005 * 2000)
+        self.assertAlmostEqual(links['ORIGIN_C0'].costs["WALK"]['batch_generalized_cost'], 0.003 * 50 / 1.42)
+
+        self.flow.step(Dt(seconds=1))
+        self.flow.update_graph()
+        links = self.mlgraph.graph.links
+        self.assertAlmostEqual(links['C0_C1'].costs["PersonalVehicle"]['batch_generalized_cost'], 0.003 * 2000 / 7 + 0.0005 * 2000)
+        self.assertAlmostEqual(links['C0_C1'].costs["PersonalVehicle"]['batch_generalized_cost'],
+                               links['C0_C1'].costs["PersonalVehicle"]['generalized_cost'])
+        self.assertAlmostEqual(self.mlgraph.layers['CAR'].graph.links['C0_C1'].costs["PersonalVehicle"]['batch_generalized_cost'],
+                               0.003 * 2000 / 7 + 0.0005 * 2000)
+
     def test_cost_update(self):
         self.supervisor.run(Time("07:00:00"),
                        Time("09:00:00"),
@@ -1,8 +1,11 @@
 import unittest
 from tempfile import TemporaryDirectory
 
-from mnms.demand.user import User, Path
+import numpy as np
+
+from mnms.demand.user import User, Path, UserState
 from mnms.flow.user_flow import UserFlow
+from mnms.flow.walking_state import WalkingUserArrays
 from mnms.graph.layers import MultiLayerGraph, CarLayer, BusLayer
 from mnms.graph.road import RoadDescriptor
 from mnms.graph.zone import construct_zone_from_sections
@@ -85,3 +88,80 @@ class TestUserFlow(unittest.TestCase):
         self.user_flow.step(Dt(minutes=1), [user])
 
         self.assertIn('U0', self.user_flow.users)
+
+    def test_answer_deadlines(self):
+        users = [User(f'U{i}', '0', '4', Time('00:01:00'), response_dt=Dt(minutes=response))
+                 for i, response in enumerate([3, 1, 2])]
+        for user in users:
+            user.set_state_waiting_answer()
+            self.user_flow.add_user(user)
+            self.user_flow._add_answer_deadline(user)
+
+        self.assertEqual([], self.user_flow.check_user_waiting_answers(Dt(minutes=1)))
+        users[2].set_state_waiting_vehicle()
+        self.assertEqual([users[1]], self.user_flow.check_user_waiting_answers(Dt(minutes=1)))
+        self.assertEqual([], self.user_flow.check_user_waiting_answers(Dt(seconds=60)))
+        self.assertEqual([users[0]], self.user_flow.check_user_waiting_answers(Dt(seconds=1)))
+
+        self.assertEqual({'U2'}, set(self.user_flow.users))
+        self.assertEqual({}, self.user_flow._waiting_answer)
+
+    def test_user_state_buckets(self):
+        users = [User(f'U{i}', '0', '4', Time('00:01:00')) for i in range(3)]
+        for user in users:
+            self.user_flow.add_user(user)
+        self.assertEqual(['U0', 'U1', 'U2'], list(self.user_flow._user_states[UserState.STOP]))
+
+        users[1].set_state_waiting_vehicle()
+        users[2].set_state_inside_vehicle()
+        users[0].set_state_waiting_vehicle()
+        self.assertEqual({}, self.user_flow._user_states[UserState.STOP])
+        self.assertEqual(['U1', 'U0'], list(self.user_flow._user_states[UserState.WAITING_VEHICLE]))
+
+        self.assertIs(users[2], self.user_flow.remove_user('U2'))
+        users[2].set_state_stop()
+        self.assertEqual({}, self.user_flow._user_states[UserState.STOP])
+        self.assertEqual({}, self.user_flow._user_states[UserState.INSIDE_VEHICLE])
+
+    def test_walking_users(self):
+        walking = WalkingUserArrays(self.mlgraph.graph.nodes)
+        users = [User(f'U{i}', '0', '4', Time('00:01:00')) for i in range(2)]
+        for user, length in zip(users, [100, 200]):
+            user._current_link = ('C0', 'C2')
+            user._position = [0, 0]
+            walking.add(user, length)
+
+        self.assertEqual([], walking.advance(60))
+        np.testing.assert_allclose([1100, 0], users[0].position)
+        np.testing.assert_allclose([1000, 0], users[1].position)
+        self.assertAlmostEqual(60, users[1].distance)
+
+        finished = walking.advance(60)
+        self.assertEqual([(users[0], 40)], finished)
+        self.assertAlmostEqual(60, users[0].distance)
+        self.assertIsNone(users[0]._walking_state)
+        self.assertEqual(1, len(walking))
+        self.assertAlmostEqual(120, users[1].distance)
+
+    def test_walking_users_remove(self):
+        walking = WalkingUserArrays(self.mlgraph.graph.nodes)
+        users = [User(f'U{i}', '0', '4', Time('00:01:00')) for i in range(4)]
+        for user, length in zip(users, [100, 200, 90, 300]):
+            user._current_link = ('C0', 'C2')
+            user._position = [0, 0]
+            walking.add(user, length)
+
+        walking.advance(30)
+        walking.remove('U1')
+        self.assertNotIn('U1', walking)
+        self.assertIsNone(users[1]._walking_state)
+        self.assertAlmostEqual(30, users[1].distance)
+        # The remaining length of the user is the one at the beginning of its last step
+        self.assertAlmostEqual(200, users[1]._remaining_link_length)
+        self.assertAlmostEqual(30, users[3].distance)
+
+        # The last user took the place of the removed one, the users still finish in the order they started
+        finished = walking.advance(80)
+        self.assertEqual([(users[0], 70), (users[2], 60)], finished)
+        self.assertEqual(['U3'], [user.id for user in walking.users])
+        self.assertAlmostEqual(110, users[3].distance)
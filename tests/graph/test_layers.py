@@ -1,6 +1,8 @@
 import unittest
 
-from mnms.graph.layers import CarLayer, BusLayer
+import numpy as np
+
+from mnms.graph.layers import CarLayer, BusLayer, OriginDestinationLayer
 from mnms.graph.road import RoadDescriptor
 from mnms.graph.zone import construct_zone_from_sections
 from mnms.mobility_service.personal_vehicle import PersonalMobilityService
@@ -85,6 +87,54 @@ class TestLayers(unittest.TestCase):
         self.assertListEqual(["0_1", "1_2"], bus_layer.map_reference_links["L0_S0_S1"])
         self.assertListEqual(["1_2", "0_1"], bus_layer.map_reference_links["L0_S1_S0"])
 
+    def test_public_transport_layer_initialize(self):
+        self.roads.register_stop("S2", "1_2", 1)
+        service = PublicTransportMobilityService("BUS")
+        bus_layer = BusLayer(self.roads,
+                             services=[service])
+
+        bus_layer.create_line("L0",
+                              ["S0", "S1", "S2"],
+                              [["0_1", "1_2"], ["1_2"]],
+                              TimeTable.create_table_freq("08:00:00", "18:00:00", Dt(minutes=10)))
+        bus_layer.initialize()
+
+        self.assertDictEqual({"L0_S0": ("L0", 0), "L0_S1": ("L0", 1), "L0_S2": ("L0", 2)}, service._stop_lines)
+        np.testing.assert_allclose([0, 1.5, 1.6], service._line_cumulative_lengths["L0"])
+
+    def test_public_transport_layer_initialize_loop(self):
+        self.roads.register_stop("S2", "1_2", 1)
+        service = PublicTransportMobilityService("BUS")
+        bus_layer = BusLayer(self.roads,
+                             services=[service])
+
+        bus_layer.create_line("L0",
+                              ["S0", "S1", "S2", "S0"],
+                              [["0_1", "1_2"], ["1_2"], ["1_2", "0_1"]],
+                              TimeTable.create_table_freq("08:00:00", "18:00:00", Dt(minutes=10)))
+        bus_layer.initialize()
+
+        self.assertEqual(("L0", 0), service._stop_lines["L0_S0"])
+        self.assertEqual(("L0", 2), service._stop_lines["L0_S2"])
+        self.assertEqual(0, service._line_cumulative_lengths["L0"][service._stop_lines["L0_S0"][1]])
+
+
+class TestOriginDestinationLayer(unittest.TestCase):
+    def test_nearest_origins_destinations(self):
+        odlayer = OriginDestinationLayer()
+        for i in range(10):
+            for j in range(10):
+                odlayer.create_origin_node(f"O_{i}_{j}", np.array([i * 100, j * 100]))
+        odlayer.create_destination_node("D0", np.array([0, 0]))
+        odlayer.create_destination_node("D1", np.array([1000, 0]))
+
+        positions = [np.array([-500, -500]), np.array([420, 380]), np.array([450, 0]), np.array([2000, 5000])]
+        self.assertEqual(["O_0_0", "O_4_4", "O_4_0", "O_9_9"], odlayer.nearest_origins(positions))
+        self.assertEqual(["D0", "D0", "D0", "D1"], odlayer.nearest_destinations(positions))
+
+        odlayer.create_destination_node("D2", np.array([400, 400]))
+        self.assertEqual(["D0", "D2", "D2", "D2"], odlayer.nearest_destinations(positions))
+
 
 class TestSerializationLayers(unittest.TestCase):
     def setUp(self):
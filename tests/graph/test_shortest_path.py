@@ -0,0 +1,85 @@
+import unittest
+
+from hipop.shortest_path import dijkstra
+
+from mnms.generation.layers import generate_layer_from_roads
+from mnms.generation.roads import generate_manhattan_road
+from mnms.graph.layers import SimpleLayer
+from mnms.graph.shortest_path import ReverseShortestPathTree
+from mnms.mobility_service.personal_vehicle import PersonalMobilityService
+from mnms.vehicles.manager import VehicleManager
+from mnms.vehicles.veh_type import Car
+
+
+class TestReverseShortestPathTree(unittest.TestCase):
+    def setUp(self) -> None:
+        roads = generate_manhattan_road(4, 100)
+        self.layer = generate_layer_from_roads(roads, 'CAR', mobility_services=[PersonalMobilityService()])
+        self.graph = self.layer.graph
+        self.graph.update_costs({lid: {'PersonalVehicle': {'travel_time': link.length / (1 + i % 3)}}
+                                 for i, (lid, link) in enumerate(self.graph.links.items())})
+
+    def tearDown(self) -> None:
+        VehicleManager.empty()
+
+    def test_costs_and_paths(self):
+        tree = ReverseShortestPathTree(self.graph, 'CAR_5', 'travel_time', 'CAR', 'PersonalVehicle')
+        for source in self.graph.nodes:
+            path, cost = dijkstra(self.graph, source, 'CAR_5', 'travel_time', {'CAR': 'PersonalVehicle'}, {'CAR'})
+            self.assertAlmostEqual(cost, tree.cost(source))
+
+            tree_path = tree.path(source)
+            if source == 'CAR_5':
+                self.assertEqual([], tree_path)
+            else:
+                self.assertEqual(source, tree_path[0])
+                self.assertEqual('CAR_5', tree_path[-1])
+                tree_cost = sum(self.graph.nodes[u].adj[d].costs['PersonalVehicle']['travel_time']
+                                for u, d in zip(tree_path[:-1], tree_path[1:]))
+                self.assertAlmostEqual(cost, tree_cost)
+
+    def test_max_cost(self):
+        tree = ReverseShortestPathTree(self.graph, 'CAR_5', 'travel_time', 'CAR', 'PersonalVehicle', max_cost=100)
+        for source in self.graph.nodes:
+            _, cost = dijkstra(self.graph, source, 'CAR_5', 'travel_time', {'CAR': 'PersonalVehicle'}, {'CAR'})
+            if cost <= 100:
+                self.assertAlmostEqual(cost, tree.cost(source))
+            else:
+                self.assertEqual(float('inf'), tree.cost(source))
+                self.assertEqual([], tree.path(source))
+
+    def test_several_targets(self):
+        tree = ReverseShortestPathTree(self.graph, ['CAR_0', 'CAR_15'], 'travel_time', 'CAR', 'PersonalVehicle')
+        for source in self.graph.nodes:
+            costs = {target: dijkstra(self.graph, source, target, 'travel_time', {'CAR': 'PersonalVehicle'},
+                                      {'CAR'})[1] if source != target else 0 for target in ['CAR_0', 'CAR_15']}
+            self.assertAlmostEqual(min(costs.values()), tree.cost(source))
+            self.assertAlmostEqual(costs[tree.root(source)], tree.cost(source))
+
+    def test_exclude_movements(self):
+        roads = generate_manhattan_road(4, 100)
+        # Each node forbids the movements from its first two upstream nodes to its first two downstream nodes,
+        # except the U-turns
+        exclude_movements = dict()
+        for nid in roads.nodes:
+            upstreams = sorted(sec.upstream for sec in roads.sections.values() if sec.downstream == nid)
+            downstreams = sorted(sec.downstream for sec in roads.sections.values() if sec.upstream == nid)
+            exclude_movements[nid] = {f'CAR_{u}': {f'CAR_{d}' for d in downstreams[:2] if d != u}
+                                      for u in upstreams[:2]}
+
+        layer = SimpleLayer(roads, 'CAR', Car, 14, [PersonalMobilityService()])
+        for nid in roads.nodes:
+            layer.create_node(f'CAR_{nid}', nid, exclude_movements.get(nid))
+        for i, (lid, section) in enumerate(roads.sections.items()):
+            layer.create_link(f'CAR_{lid}', f'CAR_{section.upstream}', f'CAR_{section.downstream}',
+                              {'PersonalVehicle': {'travel_time': section.length / (1 + i % 3)}}, [lid])
+        graph = layer.graph
+
+        tree = ReverseShortestPathTree(graph, 'CAR_5', 'travel_time', 'CAR', 'PersonalVehicle')
+        for source in graph.nodes:
+            _, cost = dijkstra(graph, source, 'CAR_5', 'travel_time', {'CAR': 'PersonalVehicle'}, {'CAR'})
+            self.assertAlmostEqual(cost if source != 'CAR_5' else 0, tree.cost(source))
+
+            tree_path = tree.path(source)
+            for upstream, node, downstream in zip(tree_path[:-2], tree_path[1:-1], tree_path[2:]):
+                self.assertNotIn(downstream, graph.nodes[node].exclude_movements.get(upstream, set()))
@@ -0,0 +1,198 @@
+import unittest
+from unittest import mock
+
+from mnms.demand import User
+from mnms.demand.user import Path
+from mnms.generation.layers import generate_layer_from_roads, _generate_matching_origin_destination_layer
+from mnms.generation.roads import generate_manhattan_road
+from mnms.graph.layers import MultiLayerGraph
+from mnms.mobility_service.abstract import AbstractMobilityService
+from mnms.mobility_service.on_demand import OnDemandMobilityService, OnDemandDepotMobilityService
+from mnms.time import Time, Dt
+from mnms.vehicles.manager import VehicleManager
+
+
+class TestOnDemandBatchMatching(unittest.TestCase):
+    def setUp(self) -> None:
+        roads = generate_manhattan_road(3, 100)
+        self.service = OnDemandMobilityService('UBER', 0, batch_matching=True)
+        layer = generate_layer_from_roads(roads, 'CAR', mobility_services=[self.service])
+        layer.graph.update_costs({lid: {'UBER': {'travel_time': link.length / 10}}
+                                  for lid, link in layer.graph.links.items()})
+
+        self.service.create_waiting_vehicle('CAR_0')
+        self.service.create_waiting_vehicle('CAR_2')
+
+        self.users = []
+        for uid, node in [('U0', 'CAR_1'), ('U1', 'CAR_0')]:
+            user = User(uid, [0, 0], [200, 200], Time('07:00:00'))
+            user._current_node = node
+            self.users.append((user, 'CAR_8'))
+
+    def tearDown(self) -> None:
+        VehicleManager.empty()
+
+    def test_batch_request(self):
+        service_dt = self.service.batch_request(self.users)
+
+        # Greedily, U0 would take the vehicle in CAR_0 and U1 the one in CAR_2
+        veh, veh_path = self.service._cache_request_vehicles['U0']
+        self.assertEqual('CAR_2', veh._current_node)
+        self.assertEqual(['CAR_2', 'CAR_1'], veh_path)
+        # The pickup dt is the travel time minimized by the assignment
+        self.assertEqual(Dt(seconds=10), service_dt['U0'])
+
+        veh, veh_path = self.service._cache_request_vehicles['U1']
+        self.assertEqual('CAR_0', veh._current_node)
+        self.assertEqual([], veh_path)
+        self.assertEqual(Dt(), service_dt['U1'])
+
+    def test_batch_request_pickup_dt(self):
+        self.users[0][0].pickup_dt['UBER'] = Dt(seconds=5)
+        service_dt = self.service.batch_request(self.users)
+
+        self.assertNotIn('U0', self.service._cache_request_vehicles)
+        self.assertEqual(Dt(hours=24), service_dt['U0'])
+        self.assertIn('U1', self.service._cache_request_vehicles)
+
+    def test_launch_matching_unassigned(self):
+        # Only one vehicle is left, U0 is not assigned but accepts a pickup dt longer than the default offer
+        self.service.fleet.delete_vehicle(next(veh.id for veh in self.service.fleet.vehicles.values()
+                                               if veh._current_node == 'CAR_2'))
+        for user, node, drop_node in [(self.users[0][0], 'CAR_1', 'CAR_2'), (self.users[1][0], 'CAR_0', 'CAR_1')]:
+            user.pickup_dt['UBER'] = Dt(hours=30)
+            user.set_path(Path(0, 0, [node, drop_node]))
+            self.service.request_vehicle(user, drop_node)
+        self.service.set_time(Time('07:00:00'))
+
+        refused = self.service.launch_matching()
+        self.assertEqual(['U0'], [user.id for user in refused])
+
+    def test_launch_matching_exception(self):
+        self.service._batch_matching = False
+        user = self.users[0][0]
+        user.set_path(Path(0, 0, ['CAR_1', 'CAR_2']))
+        user._position = self.service.graph.nodes['CAR_1'].position
+        self.service.request_vehicle(user, 'CAR_2')
+        self.service.set_time(Time('07:00:00'))
+        self.service.step_maintenance(Dt(seconds=1))
+
+        with mock.patch.object(self.service, 'matching', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.service.launch_matching()
+
+        self.assertFalse(self.service.fleet._keep_position_index)
+        self.assertIsNone(self.service.fleet._position_index)
+        self.assertEqual({}, self.service._cache_request_vehicles)
+
+    def test_nearest_vehicles(self):
+        fleet = self.service.fleet
+        position = self.service.graph.nodes['CAR_1'].position
+        self.service.create_waiting_vehicle('CAR_3')
+
+        # Without a kept index the vehicles are scanned, ties keep the order of creation
+        order = [veh._current_node for veh in fleet.nearest_vehicles(position)]
+        self.assertEqual(['CAR_0', 'CAR_2', 'CAR_3'], order)
+        self.assertIsNone(fleet._position_index)
+
+        fleet.keep_position_index()
+        self.assertEqual(order, [veh._current_node for veh in fleet.nearest_vehicles(position)])
+        self.assertIsNotNone(fleet._position_index)
+        fleet.clear_position_index()
+
+    def test_batch_matching_capacity(self):
+        class CapacityService(OnDemandMobilityService):
+            def __init__(self):
+                AbstractMobilityService.__init__(self, 'SHARED', 4, 0, 0, batch_matching=True)
+
+        with self.assertRaises(ValueError):
+            CapacityService()
+
+        class NoBatchService(OnDemandMobilityService):
+            supports_batch_matching = False
+
+        with self.assertRaises(ValueError):
+            NoBatchService('UBER2', 0, batch_matching=True)
+
+
+class TestOnDemandPickupTree(unittest.TestCase):
+    def tearDown(self) -> None:
+        VehicleManager.empty()
+
+    def request(self, pickup_tree: bool):
+        roads = generate_manhattan_road(3, 100)
+        service = OnDemandMobilityService('UBER', 0, pickup_tree=pickup_tree)
+        layer = generate_layer_from_roads(roads, 'CAR', mobility_services=[service])
+        layer.graph.update_costs({lid: {'UBER': {'travel_time': link.length / (10 + i % 3)}}
+                                  for i, (lid, link) in enumerate(layer.graph.links.items())})
+        service.create_waiting_vehicle('CAR_0')
+        service.create_waiting_vehicle('CAR_7')
+        service.step_maintenance(Dt(seconds=1))
+
+        user = User('U0', [0, 0], [200, 200], Time('07:00:00'))
+        user._current_node = 'CAR_5'
+        user._position = service.graph.nodes['CAR_5'].position
+        # Both vehicles are too far to pick up the user in time
+        user.pickup_dt['UBER'] = Dt(seconds=5)
+        service_dt = service.request(user, 'CAR_8')
+        veh, veh_path = service._cache_request_vehicles['U0']
+        VehicleManager.empty()
+        return veh._current_node, veh_path, service_dt
+
+    def test_same_as_dijkstra(self):
+        veh_node, veh_path, service_dt = self.request(False)
+        self.assertEqual('CAR_7', veh_node)
+        self.assertEqual((veh_node, veh_path, service_dt), self.request(True))
+
+
+class TestOnDemandDepotTree(unittest.TestCase):
+    def setUp(self) -> None:
+        roads = generate_manhattan_road(3, 100)
+        self.service = OnDemandDepotMobilityService('UBER', 0, depot_tree=True)
+        layer = generate_layer_from_roads(roads, 'CAR', mobility_services=[self.service])
+        layer.graph.update_costs({lid: {'UBER': {'travel_time': link.length / 10}}
+                                  for lid, link in layer.graph.links.items()})
+
+        self.service.add_depot('CAR_0', 1)
+        self.service.add_depot('CAR_8', 1)
+        self.veh = self.service._create_waiting_vehicle('CAR_5')
+
+        self.mlgraph = MultiLayerGraph([layer], _generate_matching_origin_destination_layer(roads), 1e-3)
+        self.mlgraph.construct_layer_service_mapping()
+
+    def tearDown(self) -> None:
+        VehicleManager.empty()
+
+    def test_nearest_available_depot(self):
+        # The vehicle of the depot left
+        self.service.fleet.delete_vehicle(self.service.depot['CAR_8']['vehicles'].pop())
+        self.service.step_maintenance(Dt(seconds=1))
+
+        repositioning = self.veh.activities[-1]
+        self.assertEqual('CAR_8', repositioning.node)
+        self.assertEqual([('CAR_5', 'CAR_8')], [key for key, _ in repositioning.path])
+
+    def test_full_depot(self):
+        # The vehicle of the depot left
+        self.service.fleet.delete_vehicle(self.service.depot['CAR_0']['vehicles'].pop())
+        self.service.step_maintenance(Dt(seconds=1))
+
+        repositioning = self.veh.activities[-1]
+        self.assertEqual('CAR_0', repositioning.node)
+        self.assertEqual(3, len(repositioning.path))
+
+    def test_banned_link(self):
+        self.service.fleet.delete_vehicle(self.service.depot['CAR_8']['vehicles'].pop())
+        self.service.gnodes = self.service.graph.nodes
+        self.assertEqual(['CAR_5', 'CAR_8'], self.service.get_available_depots_tree().path('CAR_5'))
+
+        # The tree computed before the ban is dropped
+        dynamic_space_sharing = self.mlgraph.dynamic_space_sharing
+        dynamic_space_sharing.cost = 'travel_time'
+        dynamic_space_sharing.ban_link('CAR_5_8', 'UBER', 1, [])
+        self.service.step_maintenance(Dt(seconds=1))
+
+        repositioning = self.veh.activities[-1]
+        self.assertEqual('CAR_8', repositioning.node)
+        self.assertEqual([('CAR_5', 'CAR_4'), ('CAR_4', 'CAR_7'), ('CAR_7', 'CAR_8')],
+                         [key for key, _ in repositioning.path])
@@ -0,0 +1,78 @@
+import unittest
+from unittest.mock import patch
+
+from mnms.demand import BaseDemandManager, User
+from mnms.demand.user import Path
+from mnms.demand.horizon import DemandHorizon
+from mnms.generation.layers import generate_layer_from_roads
+from mnms.generation.roads import generate_manhattan_road
+from mnms.mobility_service.parking_service import ParkingService, InRadiusFilter
+from mnms.time import Time, Dt
+from mnms.vehicles.veh_type import VehicleActivityServing
+from mnms.vehicles.manager import VehicleManager
+
+
+class TestParkingServiceRequest(unittest.TestCase):
+    def setUp(self) -> None:
+        roads = generate_manhattan_road(3, 100)
+        self.user = User("U0", [100, 0], [200, 200], Time("07:00:00"))
+        self.user._current_node = "CAR_3"
+        self.user._position = [100, 0]
+        horizon = DemandHorizon(BaseDemandManager([self.user]), Dt(minutes=5))
+
+        self.service = ParkingService("Parking", 0, 10, 5, horizon, vehicle_filter=InRadiusFilter(1000))
+        layer = generate_layer_from_roads(roads, "CAR", mobility_services=[self.service])
+        layer.graph.update_costs({lid: {"Parking": {"travel_time": link.length / 10}}
+                                  for lid, link in layer.graph.links.items()})
+
+        self.near_veh = self.service.create_waiting_vehicle("CAR_0")
+        self.far_veh = self.service.create_waiting_vehicle("CAR_8")
+
+    def tearDown(self) -> None:
+        VehicleManager.empty()
+
+    def test_disutility_lower_bound(self):
+        nodes = self.service.graph.nodes
+        self.assertEqual(0, self.service.get_disutility_lower_bound(self.near_veh, self.user, nodes))
+        self.assertEqual(0, self.service.get_disutility_lower_bound(self.far_veh, self.user, nodes))
+
+    def test_request_stops_at_lower_bound(self):
+        with patch.object(self.service, "replanning", wraps=self.service.replanning) as replanning:
+            service_dt = self.service.request(self.user, "CAR_8")
+
+        # Without passengers the first vehicle has a null disutility, so the second one is not evaluated
+        self.assertEqual(1, replanning.call_count)
+        self.assertIs(self.near_veh, self.service._cache_request_vehicles["U0"][0])
+        self.assertEqual(Dt(seconds=10), service_dt)
+
+    def create_vehicle_with_passenger(self, node: str, link, pid: str):
+        veh = self.service.create_waiting_vehicle(node)
+        passenger = User(pid, [0, 0], [0, 0], Time("07:00:00"))
+        passenger.parameters = {"distance_value": 1, "max_detour_ratio": 10}
+        passenger.set_path(Path(0, 0, list(link)))
+        passenger.path.mobility_services = ["Parking"]
+        passenger.path.layers = [("CAR", slice(0, 2))]
+        veh.add_activities([VehicleActivityServing(node=link[1],
+                                                   user=passenger,
+                                                   path=self.service.construct_veh_path(list(link)))])
+        veh._current_link = link
+        veh._remaining_link_length = 100
+        veh.add_passenger(passenger)
+        return veh
+
+    def test_request_with_passengers(self):
+        for veh in [self.near_veh, self.far_veh]:
+            self.service.fleet.delete_vehicle(veh.id)
+        vehicles = [self.create_vehicle_with_passenger("CAR_7", ("CAR_7", "CAR_6"), "P0"),
+                    self.create_vehicle_with_passenger("CAR_0", ("CAR_0", "CAR_3"), "P1"),
+                    self.create_vehicle_with_passenger("CAR_4", ("CAR_4", "CAR_5"), "P2")]
+        self.user.set_path(Path(0, 0, ["CAR_3", "CAR_8"]))
+        self.user.path.mobility_services = ["Parking"]
+        self.user.path.layers = [("CAR", slice(0, 2))]
+
+        disutilities = [self.service.evaluate_candidate(veh, self.user, "CAR_8")[2] for veh in vehicles]
+        self.assertEqual([0, 100, 0], disutilities)
+        self.service.request(self.user, "CAR_8")
+
+        # The stopped vehicles keep the paths of their passengers, the first vehicle without detour is chosen
+        self.assertIs(vehicles[0], self.service._cache_request_vehicles["U0"][0])
@@ -13,7 +13,9 @@ from mnms.flow.MFD import MFDFlowMotor, Reservoir
 from mnms.simulation import Supervisor
 from mnms.time import Time, Dt
 from mnms.tools.observer import CSVUserObserver, CSVVehicleObserver
+from mnms.vehicles.fleet import FleetManager
 from mnms.vehicles.manager import VehicleManager
+from mnms.vehicles.veh_type import Car, VehicleActivityStop
 
 
 class TestPersonalCar(unittest.TestCase):
@@ -79,3 +81,31 @@ class TestPersonalCar(unittest.TestCase):
 
     def test_run_and_results(self):
         pass
+
+
+class TestVehiclePool(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir_results = tempfile.TemporaryDirectory()
+        self.fleet = FleetManager(Car, "PersonalVehicle")
+
+    def tearDown(self):
+        self.temp_dir_results.cleanup()
+        VehicleManager.empty()
+
+    def test_recycle_deleted_vehicle(self):
+        veh = self.fleet.create_vehicle("C0", 1, [VehicleActivityStop(node="C0")])
+        veh.attach(CSVVehicleObserver(Path(self.temp_dir_results.name) / "veh.csv"))
+        veh.passenger["U0"] = None
+        old_id = veh.id
+        self.fleet.delete_vehicle(old_id)
+        self.assertNotIn(old_id, VehicleManager._vehicles)
+
+        new_veh = self.fleet.create_vehicle("C1", 1, [VehicleActivityStop(node="C1")])
+
+        self.assertIs(veh, new_veh)
+        self.assertNotEqual(old_id, new_veh.id)
+        self.assertIn(new_veh.id, self.fleet.vehicles)
+        self.assertIn(new_veh.id, VehicleManager._vehicles)
+        self.assertEqual("C1", new_veh._current_node)
+        self.assertEqual(dict(), new_veh.passenger)
+        self.assertEqual([], new_veh._observers)
@@ -0,0 +1,35 @@
+import unittest
+from itertools import permutations
+
+import numpy as np
+
+from mnms.tools.assignment import linear_sum_assignment
+
+
+class TestLinearSumAssignment(unittest.TestCase):
+    def setUp(self) -> None:
+        pass
+
+    def tearDown(self) -> None:
+        pass
+
+    def test_square(self):
+        costs = np.array([[4, 1, 3],
+                          [2, 0, 5],
+                          [3, 2, 2]])
+        rows, cols = linear_sum_assignment(costs)
+        np.testing.assert_array_equal([0, 1, 2], rows)
+        np.testing.assert_array_equal([1, 0, 2], cols)
+
+    def test_rectangular(self):
+        rng = np.random.default_rng(0)
+        for shape in [(3, 5), (5, 3), (4, 4), (1, 4)]:
+            costs = rng.integers(0, 10, shape)
+            rows, cols = linear_sum_assignment(costs)
+            self.assertEqual(min(shape), len(rows))
+            self.assertEqual(len(rows), len(set(cols)))
+            if shape[0] <= shape[1]:
+                best = min(costs[range(shape[0]), list(p)].sum() for p in permutations(range(shape[1]), shape[0]))
+            else:
+                best = min(costs[list(p), range(shape[1])].sum() for p in permutations(range(shape[0]), shape[1]))
+            self.assertEqual(best, costs[rows, cols].sum())
@@ -0,0 +1,47 @@
+import unittest
+
+import numpy as np
+
+from mnms.tools.geometry import GridIndex, LinkPosition
+
+
+class TestGridIndex(unittest.TestCase):
+    def setUp(self) -> None:
+        rng = np.random.default_rng(42)
+        self.points = np.round(rng.random((200, 2)) * 1000, -1)
+        self.queries = np.vstack([rng.random((50, 2)) * 1000, [[-3000, 500], [5000, 5000]]])
+        self.index = GridIndex(self.points)
+
+    def tearDown(self) -> None:
+        pass
+
+    def test_nearest(self):
+        expected = [np.argmin(np.linalg.norm(self.points - q, axis=1)) for q in self.queries]
+        np.testing.assert_array_equal(expected, self.index.nearest(self.queries))
+
+    def test_within(self):
+        for q, (points, dist) in zip(self.queries, self.index.within(self.queries, 120)):
+            expected_dist = np.linalg.norm(self.points - q, axis=1)
+            np.testing.assert_array_equal(np.flatnonzero(expected_dist < 120), points)
+            np.testing.assert_array_equal(expected_dist[expected_dist < 120], dist)
+
+    def test_iter_nearest(self):
+        for q in self.queries[:5]:
+            dist = np.linalg.norm(self.points - q, axis=1)
+            expected = np.lexsort((np.arange(len(self.points)), dist))
+            self.assertEqual(expected.tolist(), [i for i, _ in self.index.iter_nearest(q)])
+
+
+class _Node(object):
+    def __init__(self, position):
+        self.position = position
+
+
+class TestLinkPosition(unittest.TestCase):
+    def test_position(self):
+        nodes = {"A": _Node([0, 0]), "B": _Node([3, 4]), "C": _Node([3, 4])}
+        position = LinkPosition(nodes, ("A", "B"), 2)
+        np.testing.assert_allclose([1.8, 2.4], position.position)
+        self.assertIs(position.position, position.position)
+
+        np.testing.assert_allclose([3, 4], LinkPosition(nodes, ("B", "C"), 0).position)
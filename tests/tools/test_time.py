@@ -1,7 +1,7 @@
 import unittest
 from decimal import Decimal
 
-from mnms.time import Time, Dt
+from mnms.time import Time, Dt, TICKS_PER_SECOND
 
 
 class TestTime(unittest.TestCase):
@@ -40,6 +40,16 @@ class TestTime(unittest.TestCase):
         self.assertTrue(t1 <= t2)
 
 
+    def test_time_ticks(self):
+        t = Time("07:34:23.67")
+        self.assertEqual((7*3600 + 34*60 + 23) * TICKS_PER_SECOND + 670000, t.ticks)
+        self.assertEqual("07:34:23.67", Time.from_ticks(t.ticks).time)
+
+        t2 = t.add_time(Dt(minutes=30, seconds=36.33))
+        self.assertEqual("08:05:00.00", t2.time)
+        self.assertEqual(Dt(minutes=30, seconds=36.33), t2 - t)
+        self.assertEqual(t, t2.remove_time(Dt(minutes=30, seconds=36.33)))
+
 class TestDt(unittest.TestCase):
     def setUp(self) -> None:
         pass
@@ -60,6 +70,12 @@ class TestDt(unittest.TestCase):
         self.assertEqual(16, dt._minutes)
         self.assertAlmostEqual(Decimal(13.45), dt._seconds)
 
+    def test_dt_fractional(self):
+        self.assertEqual(1800, Dt(hours=0.5).to_seconds())
+        self.assertEqual(90, Dt(minutes=1.5).to_seconds())
+        self.assertEqual(Dt(hours=1, minutes=30), Dt(hours=1.25, minutes=15))
+        self.assertAlmostEqual(5400.5, Dt(hours=1.5, seconds=Decimal("0.5")).to_seconds())
+
     def test_to_sec(self):
         dt = Dt(12, 35, 13.45)
         self.assertAlmostEqual(12*3600+35*60+13.45, dt.to_seconds())
@@ -68,4 +84,10 @@ class TestDt(unittest.TestCase):
         dt = Dt(12, 35, 13.45)*2
         self.assertEqual(25, dt._hours)
         self.assertEqual(10, dt._minutes)
-        self.assertAlmostEqual(Decimal(13.45*2), dt._seconds)
\ No newline at end of file
+        self.assertAlmostEqual(Decimal(13.45*2), dt._seconds)
+
+    def test_sub_dt(self):
+        dt = Dt(1, 0, 10) - Dt(0, 30, 20.5)
+        self.assertEqual(0, dt._hours)
+        self.assertEqual(29, dt._minutes)
+        self.assertAlmostEqual(49.5, dt.to_seconds() - 29*60)
\ No newline at end of file
@@ -1,5 +1,8 @@
 import tempfile
 from pathlib import Path
+from unittest import mock
+
+from hipop.shortest_path import parallel_k_shortest_path
 
 from mnms.demand import BaseDemandManager, User
 from mnms.flow.MFD import MFDFlowMotor, Reservoir
@@ -91,4 +94,106 @@ def test_compute_all_mobility_services():
                    10)
 
     VehicleManager.empty()
-    Vehicle._counter = 0
\ No newline at end of file
+    Vehicle._counter = 0
+
+def _line_graph():
+    roads = generate_line_road([0, 0], [0, 3000], 4)
+    car_layer = CarLayer(roads, services=[PersonalMobilityService()])
+    car_layer.create_node("CAR_0", "0")
+    car_layer.create_node("CAR_1", "1")
+    car_layer.create_node("CAR_3", "3")
+    car_layer.create_link("CAR_0_1", "CAR_0", "CAR_1", {}, ["0_1"])
+    car_layer.create_link("CAR_1_3", "CAR_1", "CAR_3", {}, ["1_2", "2_3"])
+
+    odlayer = _generate_matching_origin_destination_layer(roads)
+    mlgraph = MultiLayerGraph([car_layer], odlayer, 1e-3)
+
+    flow_motor = MFDFlowMotor()
+    flow_motor.add_reservoir(Reservoir(roads.zones["RES"], ["CAR"], lambda x: {"CAR": 3}))
+    flow_motor.set_graph(mlgraph)
+    flow_motor.initialize(1.42)
+    return mlgraph
+
+
+def test_shortest_path_dedup():
+    mlgraph = _line_graph()
+    decision_model = LogitDecisionModel(mlgraph)
+    users = [User(f"U{i}", "ORIGIN_0", "DESTINATION_3", Time("07:00:00"), ["PersonalVehicle"]) for i in range(3)]
+    with mock.patch("mnms.travel_decision.abstract.parallel_k_shortest_path",
+                    wraps=parallel_k_shortest_path) as shortest_path:
+        decision_model(users, Time("07:00:00"))
+
+    shortest_path.assert_called_once()
+    assert shortest_path.call_args.args[1] == ["ORIGIN_0"]
+    assert users[0].path.nodes == ["ORIGIN_0", "CAR_0", "CAR_1", "CAR_3", "DESTINATION_3"]
+    for user in users[1:]:
+        assert user.path.nodes == users[0].path.nodes
+        assert user.path.nodes is not users[0].path.nodes
+    assert decision_model.path_cache_hits == 0
+    assert decision_model.path_cache_misses == 0
+
+    VehicleManager.empty()
+    Vehicle._counter = 0
+
+
+def test_path_cache():
+    mlgraph = _line_graph()
+    decision_model = DummyDecisionModel(mlgraph, cache_paths=True)
+    users = [User(f"U{i}", "ORIGIN_0", "DESTINATION_3", Time("07:00:00")) for i in range(3)]
+    decision_model(users, Time("07:00:00"))
+    assert decision_model.path_cache_misses == 1
+    assert decision_model.path_cache_hits == 2
+    assert users[0].path.nodes == users[2].path.nodes
+    assert users[0].path.nodes is not users[2].path.nodes
+
+    users = [User(f"U{i}", "ORIGIN_0", "DESTINATION_3", Time("07:00:00")) for i in range(3, 5)]
+    decision_model(users, Time("07:00:00"))
+    assert decision_model.path_cache_misses == 1
+    assert decision_model.path_cache_hits == 4
+    assert users[0].path.nodes == ["ORIGIN_0", "CAR_0", "CAR_1", "CAR_3", "DESTINATION_3"]
+    assert users[0].path.nodes is not users[1].path.nodes
+
+    decision_model.invalidate_path_cache({"CAR_0_1"})
+    decision_model([User("U5", "ORIGIN_0", "DESTINATION_3", Time("07:00:00"))], Time("07:00:00"))
+    assert decision_model.path_cache_misses == 2
+
+    decision_model.invalidate_path_cache({"CAR_2_3"})
+    decision_model.invalidate_path_cache(set())
+    decision_model([User("U6", "ORIGIN_0", "DESTINATION_3", Time("07:00:00"))], Time("07:00:00"))
+    assert decision_model.path_cache_hits == 5
+
+    decision_model.invalidate_path_cache()
+    decision_model([User("U7", "ORIGIN_0", "DESTINATION_3", Time("07:00:00"))], Time("07:00:00"))
+    assert decision_model.path_cache_misses == 3
+
+    VehicleManager.empty()
+    Vehicle._counter = 0
+
+def test_path_cache_banned_link():
+    mlgraph = _line_graph()
+    mlgraph.construct_layer_service_mapping()
+    decision_model = DummyDecisionModel(mlgraph, cache_paths=True)
+    dynamic_space_sharing = mlgraph.dynamic_space_sharing
+    dynamic_space_sharing.cost = "travel_time"
+    dynamic_space_sharing.decision_model = decision_model
+
+    user = User("U0", "ORIGIN_0", "DESTINATION_3", Time("07:00:00"))
+    decision_model([user], Time("07:00:00"))
+    assert user.path.nodes == ["ORIGIN_0", "CAR_0", "CAR_1", "CAR_3", "DESTINATION_3"]
+
+    # The cached path goes through the banned link, it is computed again and there is no path left
+    dynamic_space_sharing.ban_link("CAR_1_3", "PersonalVehicle", 1, [])
+    user = User("U1", "ORIGIN_0", "DESTINATION_3", Time("07:00:00"))
+    decision_model([user], Time("07:00:00"))
+    assert user.path is None
+    assert decision_model.path_cache_misses == 2
+
+    # The query without path is not cached, the path is found again once the link is unbanned
+    dynamic_space_sharing.unban_link("CAR_1_3")
+    user = User("U2", "ORIGIN_0", "DESTINATION_3", Time("07:00:00"))
+    decision_model([user], Time("07:00:00"))
+    assert user.path.nodes == ["ORIGIN_0", "CAR_0", "CAR_1", "CAR_3", "DESTINATION_3"]
+    assert decision_model.path_cache_misses == 3
+
+    VehicleManager.empty()
+    Vehicle._counter = 0